@@ -1 +1,6 @@
+from .load_checkpoint import LoadCheckpoint  # noqa: E402
+from .load_table_writer import LoadTableWriter  # noqa: E402
 from .wherescape import WhereScape  # noqa: E402
+
+
+__all__ = ["LoadCheckpoint", "LoadTableWriter", "WhereScape"]
@@ -0,0 +1,324 @@
+"""
+Module with the database backends of the WhereScape class.
+
+The ODBC backend is used when running on a WhereScape server. The SQLite
+backend stands in for the WhereScape repository and the target and source
+databases, so jobs and loads can be run and benchmarked on any machine.
+
+The backend is selected with the WSL_BACKEND environment variable ('odbc' or
+'sqlite'), see ws_env_template.setup_env().
+"""
+
+import logging
+import os
+import sqlite3
+from datetime import date, datetime
+from decimal import Decimal
+
+
+try:
+    # pyodbc needs the unixODBC libraries on Linux, which aren't needed for
+    #   the SQLite backend.
+    import pyodbc
+except ImportError:
+    pyodbc = None
+
+
+class OdbcBackend:
+    """
+    Connects to the WhereScape repository, target and source databases with
+    the ODBC DSNs set up by WhereScape.
+    """
+
+    name = "odbc"
+
+    # Whether the target database can be loaded with a PostgreSQL COPY
+    supports_copy = True
+
+    # SQL statements that replace the WhereScape procedure calls, by name
+    statements = {}
+
+    def __init__(self):
+        if pyodbc is None:
+            raise ImportError("The odbc backend needs the pyodbc package")
+        self.errors = (pyodbc.Error,)
+
+    def connect(self, database, connection_string):
+        """
+        Returns a new connection to a database.
+        """
+        return pyodbc.connect(connection_string)
+
+    def is_disconnect(self, error):
+        """
+        Returns whether an error indicates that the connection itself is broken.
+        """
+        return isinstance(error, pyodbc.OperationalError) or (
+            isinstance(error, pyodbc.Error) and bool(error.args) and str(error.args[0]).startswith("08")
+        )
+
+    def get_database_name(self, conn):
+        """
+        Returns the name of the database a connection is connected to.
+        """
+        return conn.getinfo(pyodbc.SQL_DATABASE_NAME)
+
+    def escape_like(self, value):
+        """
+        Escapes the LIKE wildcards in value, so it's matched literally.
+        """
+        return value.replace("[", "[[]").replace("%", "[%]").replace("_", "[_]")
+
+
+class SqliteCursor(sqlite3.Cursor):
+    """
+    SQLite cursor that accepts the pyodbc specific cursor attributes.
+    """
+
+    fast_executemany = False
+
+
+class SqliteConnection(sqlite3.Connection):
+    """
+    SQLite connection with the pyodbc connection attributes that the
+    WhereScape class uses.
+    """
+
+    closed = False
+
+    def cursor(self, factory=SqliteCursor):
+        return super().cursor(factory)
+
+    def close(self):
+        super().close()
+        self.closed = True
+
+
+class SqliteBackend:
+    """
+    Stands in for the WhereScape databases with SQLite. The meta database
+    emulates the ws_load_tab, ws_load_col, ws_stage_tab, ws_stage_col and
+    dss_parameter tables and a task log, the target and source database get
+    one attached database per schema (e.g. 'load'), so 'schema.table' names
+    work unchanged.
+
+    With path ':memory:' (the default) all databases live in memory and share
+    one connection, so the data is gone when the script exits.
+
+    Example:
+    backend = SqliteBackend()
+    backend.create_load_table(wherescape_instance, "load_gitlab_issues", [("id", "integer"), ("title", "text")])
+    """
+
+    name = "sqlite"
+    supports_copy = False
+    errors = (sqlite3.Error,)
+
+    statements = {
+        "WsParameterRead": """
+            SELECT dss_parameter_value, dss_parameter_comments
+            FROM dss_parameter
+            WHERE lower(dss_parameter_name) = lower(?)""",
+        "WsParameterWrite": """
+            INSERT INTO dss_parameter (dss_parameter_name, dss_parameter_value, dss_parameter_comments)
+            VALUES (?, ?, ?)
+            ON CONFLICT (dss_parameter_name) DO UPDATE SET
+                dss_parameter_value = excluded.dss_parameter_value,
+                dss_parameter_comments = coalesce(excluded.dss_parameter_comments, dss_parameter_comments)""",
+        "WsWrkTask": """
+            INSERT INTO ws_wrk_task_log (
+                job_key, task_key, sequence, inserted, updated, replaced, deleted, discarded, rejected, errored
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        # The SQLite backend keeps no job logs or archives to clear
+        "Ws_Job_Clear_Logs_By_Date": """
+            SELECT 'S', 'No logs to clear in the sqlite backend', 1
+            FROM (SELECT ?, ?, ?, ?, ?, ?, ?)""",
+        "Ws_Job_Clear_Archive": """
+            SELECT 'S', 'No archives to clear in the sqlite backend', 1
+            FROM (SELECT ?, ?, ?, ?, ?, ?, ?, ?)""",
+        "prefetch_parameters": """
+            SELECT dss_parameter_name, dss_parameter_value, dss_parameter_comments
+            FROM dss_parameter
+            WHERE dss_parameter_name LIKE ? ESCAPE '\\'""",
+    }
+
+    repository_sql = """
+        CREATE TABLE IF NOT EXISTS ws_load_tab (
+            lt_obj_key INTEGER PRIMARY KEY,
+            lt_table_name TEXT NOT NULL UNIQUE,
+            lt_file_path TEXT,
+            lt_file_name TEXT
+        );
+        CREATE TABLE IF NOT EXISTS ws_load_col (
+            lc_obj_key INTEGER NOT NULL,
+            lc_col_name TEXT NOT NULL,
+            lc_data_type TEXT,
+            lc_order INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS ws_stage_tab (
+            st_obj_key INTEGER PRIMARY KEY,
+            st_table_name TEXT NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS ws_stage_col (
+            sc_obj_key INTEGER NOT NULL,
+            sc_col_name TEXT NOT NULL,
+            sc_data_type TEXT,
+            sc_order INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS dss_parameter (
+            dss_parameter_name TEXT PRIMARY KEY COLLATE NOCASE,
+            dss_parameter_value TEXT,
+            dss_parameter_comments TEXT
+        );
+        CREATE TABLE IF NOT EXISTS ws_wrk_task_log (
+            job_key TEXT,
+            task_key TEXT,
+            sequence TEXT,
+            inserted INTEGER,
+            updated INTEGER,
+            replaced INTEGER,
+            deleted INTEGER,
+            discarded INTEGER,
+            rejected INTEGER,
+            errored INTEGER,
+            logged_at TEXT DEFAULT CURRENT_TIMESTAMP
+        );"""
+
+    def __init__(self, path=":memory:", schemas=("load", "stage")):
+        """
+        Initialises the backend.
+
+        Args:
+            path (str): Path of the SQLite database file, or ':memory:'. The
+                schemas are stored in files next to it, e.g. 'wherescape_load.sqlite'.
+            schemas (tuple): Schemas that are attached to the connections.
+        """
+        self.path = path
+        self.schemas = tuple(schemas)
+        self._memory_connection = None
+
+        # Store values the same way as they are sent to the target database
+        sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+        sqlite3.register_adapter(date, lambda value: value.isoformat())
+        sqlite3.register_adapter(Decimal, str)
+
+    def connect(self, database, connection_string):
+        """
+        Returns a connection to the SQLite database. The connection string is
+        ignored; meta, target and source all use the same database.
+        """
+        if self.path == ":memory:":
+            if self._memory_connection is None or self._memory_connection.closed:
+                self._memory_connection = self._connect()
+            return self._memory_connection
+        return self._connect()
+
+    def _connect(self):
+        """
+        Opens a connection, attaches the schemas and creates the repository tables.
+        """
+        conn = sqlite3.connect(self.path, factory=SqliteConnection, check_same_thread=False)
+        for schema in self.schemas:
+            conn.execute("ATTACH DATABASE ? AS " + schema, [self._get_schema_path(schema)])
+        # With write-ahead logging, a query that is being iterated on one connection
+        #   doesn't block the writes on another (see WhereScape.iter_target)
+        for schema in ("main", *self.schemas):
+            conn.execute(f"PRAGMA {schema}.journal_mode = WAL")
+        conn.executescript(self.repository_sql)
+        conn.commit()
+        logging.debug(f"Connected to the sqlite backend at {self.path}")
+        return conn
+
+    def _get_schema_path(self, schema):
+        """
+        Returns the path of the database file of a schema.
+        """
+        if self.path == ":memory:":
+            return ":memory:"
+        base_path, extension = os.path.splitext(self.path)
+        return f"{base_path}_{schema}{extension}"
+
+    def is_disconnect(self, error):
+        """
+        Returns whether an error indicates that the connection itself is broken.
+        """
+        return isinstance(error, sqlite3.ProgrammingError) and "closed" in str(error)
+
+    def get_database_name(self, conn):
+        """
+        Returns the name of the database a connection is connected to.
+        """
+        return self.path
+
+    def escape_like(self, value):
+        """
+        Escapes the LIKE wildcards in value, so it's matched literally.
+        """
+        return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    def create_load_table(self, wherescape_instance, table_name, columns, file_path="", file_name=""):
+        """
+        Creates a load table in the target database and registers it and its
+        columns in ws_load_tab and ws_load_col, as WhereScape would. The
+        dss_record_source and dss_load_date columns are added when missing.
+
+        Args:
+            wherescape_instance (WhereScape): WhereScape instance to create the table with
+            table_name (str): Name of the load table, without schema
+            columns (list): (column name, data type) tuples
+            file_path (str): lt_file_path of the load table
+            file_name (str): lt_file_name of the load table
+
+        Returns:
+        int: object key of the load table
+        """
+        columns = list(columns)
+        column_names = [column_name for column_name, _ in columns]
+        if "dss_record_source" not in column_names:
+            columns.append(("dss_record_source", "varchar(256)"))
+        if "dss_load_date" not in column_names:
+            columns.append(("dss_load_date", "timestamp"))
+
+        wherescape_instance.push_to_meta(
+            "DELETE FROM ws_load_col WHERE lc_obj_key IN (SELECT lt_obj_key FROM ws_load_tab WHERE lt_table_name = ?)",
+            [table_name],
+        )
+        wherescape_instance.push_to_meta("DELETE FROM ws_load_tab WHERE lt_table_name = ?", [table_name])
+        wherescape_instance.push_to_meta(
+            "INSERT INTO ws_load_tab (lt_table_name, lt_file_path, lt_file_name) VALUES (?, ?, ?)",
+            [table_name, file_path, file_name],
+        )
+        object_key = wherescape_instance.query_meta(
+            "SELECT lt_obj_key FROM ws_load_tab WHERE lt_table_name = ?", [table_name]
+        )[0][0]
+        for order, (column_name, data_type) in enumerate(columns, start=1):
+            wherescape_instance.push_to_meta(
+                "INSERT INTO ws_load_col (lc_obj_key, lc_col_name, lc_data_type, lc_order) VALUES (?, ?, ?, ?)",
+                [object_key, column_name, data_type, order],
+            )
+
+        column_definitions = ", ".join(f"{column_name} {data_type}" for column_name, data_type in columns)
+        wherescape_instance.push_to_target(f"DROP TABLE IF EXISTS load.{table_name}")
+        wherescape_instance.push_to_target(f"CREATE TABLE load.{table_name} ({column_definitions})")
+        return object_key
+
+
+def create_backend(name=None):
+    """
+    Returns the backend with the given name. Defaults to the WSL_BACKEND
+    environment variable, or 'odbc' when that isn't set. The SQLite backend
+    is configured with WSL_SQLITE_PATH and WSL_SQLITE_SCHEMAS (comma separated).
+    """
+    if name is None:
+        name = os.getenv("WSL_BACKEND", "odbc")
+
+    if name == "odbc":
+        return OdbcBackend()
+    if name == "sqlite":
+        schemas = os.getenv("WSL_SQLITE_SCHEMAS", "load,stage")
+        return SqliteBackend(
+            path=os.getenv("WSL_SQLITE_PATH", ":memory:"),
+            schemas=[schema.strip() for schema in schemas.split(",") if schema.strip()],
+        )
+    raise ValueError(f"Invalid backend: {name}")
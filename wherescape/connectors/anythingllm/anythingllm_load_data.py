@@ -2,7 +2,7 @@ import logging
 import os
 from datetime import datetime
 
-from ...helper_functions import create_column_names
+from ...load_table_writer import LoadTableWriter
 from ...wherescape import WhereScape
 from .anythingllm_create_metadata import EXPECTED_COLUMNS
 
@@ -10,11 +10,17 @@ from .anythingllm_create_metadata import EXPECTED_COLUMNS
 from .anythingllm_wrapper import get_all_embed_chats
 
 
-def anythingllm_load_data_chats():
+def anythingllm_load_data_chats(load_method=None):
     """
     Function to be called from the host script in WhereScape. Will import
     chat data to the load table. This is the glue between the anythingllm_wrapper
     and WhereScape.
+
+    Args:
+        load_method (str): How the rows are loaded into the load table, see
+            WhereScape.bulk_load_to_target. One of "executemany",
+            "fast_executemany", "values" or "copy", or "fastest" for the fastest
+            method available. Defaults to "executemany".
     """
     start_time = datetime.now()
     # First initialise WhereScape to setup logging
@@ -65,31 +71,19 @@ def anythingllm_load_data_chats():
             if "connection_ip" in record:
                 record["connection_ip"] = "[MASKED]"
 
-        # Prepare columns names for query.
-        columns = create_column_names(columns)
-        columns.append("dss_record_source")
-        columns.append("dss_load_date")
-
-        # Append dss column data to all rows.
-        rows = []
-        for record in values:
-            row = list(record.values())
-            row.append("AnythingLLM api - chats")
-            row.append(start_time)
-            rows.append(row)
-
-        # Prepare the sql
-        logging.info("Preparing insert query")
-        column_names_string = ",".join(column for column in columns)
-        question_mark_string = ",".join("?" for _ in columns)
-        sql = f"INSERT INTO {table_name} ({column_names_string}) VALUES ({question_mark_string})"
-
-        # Execute the sql
-        wherescape_instance.push_many_to_target(sql, rows)
-        logging.info(f"Successfully inserted {len(rows)} rows in to the load table.")
+        # Write the records; the column names are taken from the first record
+        writer = LoadTableWriter(
+            wherescape_instance,
+            "AnythingLLM api - chats",
+            table_name=table_name,
+            load_date=start_time,
+            load_method=load_method,
+        )
+        row_count = writer.write(values)
+        logging.info(f"Successfully inserted {row_count} rows in to the load table.")
 
         # Add success message
-        wherescape_instance.main_message = f"Successfully inserted {len(rows)} rows in to the load table."
+        wherescape_instance.main_message = f"Successfully inserted {row_count} rows in to the load table."
 
     else:
         logging.info("No object changes received from AnythingLLM")
@@ -55,7 +55,7 @@ def friday_pulse_create_metadata():
         return
 
     # Initialize Friday Pulse client
-    client = FridayPulseClient(bearer_token)
+    client = FridayPulseClient(bearer_token, cache_dir=wherescape.workdir)
 
     # Step 3 & 4: Determine subject and fetch sample data
     sample_data = []
@@ -9,7 +9,7 @@ import logging
 import os
 from datetime import datetime, timedelta
 
-from ...helper_functions import create_column_names
+from ...load_table_writer import LoadTableWriter
 from ...wherescape import WhereScape
 from .friday_pulse_wrapper import FridayPulseClient
 
@@ -48,7 +48,7 @@ def get_incremental_since_date(
     return since_date
 
 
-def friday_pulse_load_data(lookback_weeks: int = 3):
+def friday_pulse_load_data(lookback_weeks: int = 3, load_method: str | None = None):
     """
     Main Friday Pulse load data function. Loads data from Friday Pulse and pushes it to
     the warehouse. This is the glue between the friday_pulse_wrapper and WhereScape.
@@ -67,6 +67,9 @@ def friday_pulse_load_data(lookback_weeks: int = 3):
                        late responses. Default is 3 weeks. Only applies to endpoints
                        that support date filtering (general_results, group_results, group_notes,
                        general_notes, general_risks, group_risks).
+        load_method: How the rows are loaded into the load table, see WhereScape.bulk_load_to_target.
+                     One of "executemany", "fast_executemany", "values" or "copy", or "fastest" for
+                     the fastest method available. Default is "executemany".
     """
     start_time = datetime.now()
 
@@ -100,113 +103,89 @@ def friday_pulse_load_data(lookback_weeks: int = 3):
         hwm_table_name = table_name
     hwm_param_name = f"HWM_{hwm_table_name}"
 
-    # Initialize Friday Pulse client
-    client = FridayPulseClient(bearer_token)
-
-    # Determine which endpoint to use and fetch data
-    values = []
-    source_description = ""
-
-    if "topics" in table_name:
-        logging.info("Loading topics data...")
-        values = client.get_topics()
-        source_description = "topics"
-
-    elif "group_types" in table_name:
-        logging.info("Loading group types data...")
-        values = client.get_group_types()
-        source_description = "group_types"
-
-    elif "groups" in table_name:
-        logging.info("Loading groups data...")
-        values = client.get_groups()
-        source_description = "groups"
-
-    elif "group_notes" in table_name:
-        since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "group notes")
-        logging.info("Loading group notes data...")
-        values = client.get_group_notes(since_date=since_date)
-        source_description = "group_notes"
-
-    elif "group_results" in table_name:
-        since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "group results")
-        logging.info("Loading group results data...")
-        values = client.get_group_results(since_date=since_date)
-        source_description = "group_results"
-
-    elif "general_notes" in table_name:
-        since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "general notes")
-        logging.info("Loading general notes data...")
-        values = client.get_general_notes(since_date=since_date)
-        source_description = "general_notes"
-
-    elif "group_risks" in table_name:
-        since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "group risks")
-        logging.info("Loading group risks data...")
-        values = client.get_group_risks(since_date=since_date)
-        source_description = "group_risks"
-
-    elif "general_risks" in table_name:
-        since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "general risks")
-        logging.info("Loading general risks data...")
-        values = client.get_general_risks(since_date=since_date)
-        source_description = "general_risks"
-
-    elif "general_results" in table_name:
-        since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "results")
-        logging.info("Loading general results data...")
-        values = client.get_general_results(since_date=since_date)
-        source_description = "general_results"
+    # Initialize Friday Pulse client, its connections are closed once the data is fetched
+    with FridayPulseClient(bearer_token, cache_dir=wherescape.workdir) as client:
+        # Determine which endpoint to use and fetch data
+        values = []
+        source_description = ""
+
+        if "topics" in table_name:
+            logging.info("Loading topics data...")
+            values = client.get_topics()
+            source_description = "topics"
+
+        elif "group_types" in table_name:
+            logging.info("Loading group types data...")
+            values = client.get_group_types()
+            source_description = "group_types"
+
+        elif "groups" in table_name:
+            logging.info("Loading groups data...")
+            values = client.get_groups()
+            source_description = "groups"
+
+        elif "group_notes" in table_name:
+            since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "group notes")
+            logging.info("Loading group notes data...")
+            values = client.get_group_notes(since_date=since_date)
+            source_description = "group_notes"
+
+        elif "group_results" in table_name:
+            since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "group results")
+            logging.info("Loading group results data...")
+            values = client.get_group_results(since_date=since_date)
+            source_description = "group_results"
+
+        elif "general_notes" in table_name:
+            since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "general notes")
+            logging.info("Loading general notes data...")
+            values = client.get_general_notes(since_date=since_date)
+            source_description = "general_notes"
+
+        elif "group_risks" in table_name:
+            since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "group risks")
+            logging.info("Loading group risks data...")
+            values = client.get_group_risks(since_date=since_date)
+            source_description = "group_risks"
+
+        elif "general_risks" in table_name:
+            since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "general risks")
+            logging.info("Loading general risks data...")
+            values = client.get_general_risks(since_date=since_date)
+            source_description = "general_risks"
+
+        elif "general_results" in table_name:
+            since_date = get_incremental_since_date(wherescape, hwm_param_name, lookback_weeks, "results")
+            logging.info("Loading general results data...")
+            values = client.get_general_results(since_date=since_date)
+            source_description = "general_results"
 
-    else:
-        logging.error(
-            f"Unknown table name pattern: '{table_name}'. "
-            f"Table name must contain one of: topics, group_types, groups, group_notes, "
-            f"group_results, general_notes, group_risks, general_risks, general_results, results"
-        )
-        wherescape.main_message = f"Error: Unknown subject in table name '{table_name}'"
-        return
-
-    # Check if we have data
-    if values:
-        # Get column names from the first record
-        if len(values) > 0:
-            original_columns = list(values[0].keys())
         else:
-            logging.info("No data received from Friday Pulse")
-            wherescape.main_message = "No data received from Friday Pulse"
-            wherescape.update_task_log(inserted=0)
+            logging.error(
+                f"Unknown table name pattern: '{table_name}'. "
+                f"Table name must contain one of: topics, group_types, groups, group_notes, "
+                f"group_results, general_notes, group_risks, general_risks, general_results, results"
+            )
+            wherescape.main_message = f"Error: Unknown subject in table name '{table_name}'"
             return
 
-        # Prepare columns names for query
-        columns = create_column_names(original_columns)
-        columns.append("dss_record_source")
-        columns.append("dss_load_date")
-
-        # Append dss column data to all rows, ensuring column order matches
-        rows = []
-        for record in values:
-            # Extract values in the same order as original_columns
-            row = [record.get(col) for col in original_columns]
-            row.append(f"Friday Pulse API - {source_description}")
-            row.append(start_time)
-            rows.append(row)
-
-        # Prepare the sql
-        logging.info("Preparing insert query")
-        column_names_string = ",".join(column for column in columns)
-        question_mark_string = ",".join("?" for _ in columns)
-        sql = f"INSERT INTO {table_name_with_schema} ({column_names_string}) VALUES ({question_mark_string})"
-
-        # Execute the sql
-        wherescape.push_many_to_target(sql, rows)
-
+    # Write the records; the column names are taken from the first record
+    writer = LoadTableWriter(
+        wherescape,
+        f"Friday Pulse API - {source_description}",
+        table_name=table_name_with_schema,
+        load_date=start_time,
+        load_method=load_method,
+    )
+    row_count = writer.write(values)
+
+    if row_count > 0:
         # Set success message
         wherescape.main_message = (
-            f"Loaded {len(rows)} Friday Pulse {source_description} records into {table_name_with_schema}"
+            f"Loaded {row_count} Friday Pulse {source_description} records into {table_name_with_schema}"
         )
-        wherescape.update_task_log(inserted=len(rows))
-        logging.info(f"Successfully loaded {len(rows)} records")
+        wherescape.update_task_log(inserted=row_count)
+        logging.info(f"Successfully loaded {row_count} records")
 
     else:
         wherescape.main_message = f"No new {source_description} data received from Friday Pulse"
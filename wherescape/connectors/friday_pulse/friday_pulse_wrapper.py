@@ -6,12 +6,15 @@ functions to fetch and flatten results data for warehouse loading.
 """
 
 import logging
+import os
 import time
 from typing import Any
 
 import requests
 
 from ...helper_functions import flatten_json
+from ..http_cache import HttpCache
+from ..sessions import create_session
 
 
 class FridayPulseClient:
@@ -23,13 +26,30 @@ class FridayPulseClient:
     fetching results for a given date.
     """
 
-    def __init__(self, bearer_token: str):
+    # Endpoints of which the responses are kept in the http cache
+    cached_endpoints = ("api/v1/topics", "api/v1/group-types")
+
+    def __init__(self, bearer_token: str, cache_dir: str = None):
         """Initialize the client with a bearer token for authentication.
 
         Args:
             bearer_token: The bearer token for API authentication
+            cache_dir: Optional directory (e.g. the WhereScape workdir) for the http cache
+                of the topics, group types and groups, which are revalidated with their ETag
         """
         self._bearer_token = bearer_token
+        self._session = create_session(headers={"Authorization": f"Bearer {bearer_token}"})
+        self._http_cache = HttpCache(os.path.join(cache_dir, "http_cache")) if cache_dir is not None else None
+
+    def close(self):
+        """Close the connections to the FridayPulse API."""
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     # Private helper methods
 
@@ -56,11 +76,12 @@ class FridayPulseClient:
 
         for attempt in range(max_retries):
             try:
-                response = requests.get(
-                    full_url,
-                    headers={"Authorization": f"Bearer {self._bearer_token}"},
-                    timeout=timeout,
-                )
+                if self._http_cache is not None and url.startswith(self.cached_endpoints):
+                    response = self._http_cache.request(
+                        lambda headers: self._session.get(full_url, headers=headers, timeout=timeout), full_url
+                    )
+                else:
+                    response = self._session.get(full_url, timeout=timeout)
                 response.raise_for_status()
                 break  # Success, exit retry loop
 
@@ -1,59 +1,243 @@
 """Module to fetch data (e.g. tickets, projects, pipelines) from the Gitlab API"""
 
+import contextlib
+import hashlib
+import json
 import logging
+import os
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+from itertools import chain
+from urllib.parse import parse_qsl, urlencode, urlparse
 
 import requests
+from dateutil.parser import parse
 
-from ...helper_functions import fill_out_empty_keys, filter_dict, flatten_json
+from ...helper_functions import fill_out_empty_keys, filter_dict, flatten_json, iterate_concurrently
+from ..http_cache import CACHE_READ_ERRORS, HttpCache
+from ..rate_limit import RateLimiter
+from ..sessions import create_session
 from .gitlab_data_types_column_names import COLUMN_NAMES_AND_DATA_TYPES
 
 
 class Gitlab:
-    def __init__(self, access_token, base_url, since=None):
+    # Endpoints of which the responses are kept in the http cache
+    cached_resources = ("/projects", "/repository/branches")
+
+    # Page sizes: Gitlab returns at most 100 objects per page
+    default_page_size = 100
+    max_page_size = 100
+    min_page_size = 10
+
+    # With adaptive paging, pages that take less seconds than this get larger
+    fast_response_seconds = 1
+
+    def __init__(
+        self,
+        access_token,
+        base_url,
+        since=None,
+        concurrency=4,
+        rate_limiter=None,
+        cache_dir=None,
+        cache_ttl=3600,
+        cache_scope=None,
+        activity_margin=timedelta(days=1),
+        skip_inactive_projects=(),
+        page_sizes=None,
+        adaptive_paging=False,
+        request_timeout=60,
+        project_since=None,
+        skip_projects=None,
+    ):
         """
         Initializes the Gitlab class. needs the Gitlab access token, base url
         and an optional `since` parameter. Since should be the date from which
-        data should be loaded.
+        data should be loaded. `concurrency` is the number of projects that
+        are fetched at the same time. All requests go through the rate_limiter,
+        which by default follows the rate limit headers of Gitlab.
+
+        When a cache_dir is given (e.g. the WhereScape workdir), the project list
+        is cached there for cache_ttl seconds, so the load tasks of one job only
+        fetch the projects once. The cache is per base url, access token and
+        cache_scope. Pass the job run as cache_scope (e.g. the job key and
+        sequence), so the next run of the job never reuses the cached projects.
+        The responses of the projects and branches endpoints are also kept in an
+        http cache in the cache_dir, and revalidated with their ETag on the next run.
+
+        With `since`, the resources in skip_inactive_projects (e.g. ("issues",
+        "commits")) are only fetched for projects with a last_activity_at after
+        since minus activity_margin. Gitlab updates last_activity_at at most once
+        an hour, the margin makes sure no recent activity is missed. Not every
+        change updates last_activity_at, so this is opt-in per resource. Pipelines
+        are always fetched for all projects, since scheduled pipelines and status
+        changes don't update it.
+
+        page_sizes sets the number of objects per page by resource type, the last
+        part of the resource url (e.g. {"commits": 50, "issues": 100}); other
+        resources use default_page_size. With adaptive_paging the page size of a
+        resource is doubled after fast, full pages and halved after slow pages or
+        when a request takes longer than request_timeout seconds.
+
+        project_since overrides since for some projects, by project id (e.g.
+        {"12": "2024-01-01T00:00:00"}), for projects that lag behind because
+        their last load failed. The projects in skip_projects (e.g. the ones already
+        loaded before a crash, see LoadCheckpoint) are not fetched at all.
         """
         self.access_token = access_token
         self.base_url = base_url
         self.since = since
+        self.project_since = {str(project_id): value for project_id, value in (project_since or {}).items()}
+        self.skip_projects = {str(project_id) for project_id in (skip_projects or ())}
+        self.concurrency = max(1, concurrency)
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        self.cache_scope = cache_scope
+        self.activity_margin = activity_margin
+        self.skip_inactive_projects = set(skip_inactive_projects)
+        self.page_sizes = dict(page_sizes or {})
+        self.adaptive_paging = adaptive_paging
+        self.request_timeout = request_timeout
+
+        # Page sizes by resource type as adjusted by adaptive paging, shared by all projects
+        self._adaptive_page_sizes = {}
+
+        # Pages, objects and seconds by resource type, see log_page_stats
+        self.page_stats = {}
+        self._page_stats_lock = threading.Lock()
+
+        # IDs of the projects for which fetching a resource failed
+        self.failed_projects = []
+
+        # Merge requests fetched by get_merge_requests, reused by get_merge_request_commits
+        self.merge_requests = None
+
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+
+        # One connection per thread is kept open to the Gitlab API
+        self.session = create_session(
+            pool_size=self.concurrency,
+            headers={
+                "Accept": "application/json",
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self.access_token}",
+            },
+        )
 
-        # Project IDs are needed to get the other resources as well.
-        self.projects = self.get_projects()
-
-    def make_request(self, url, method, params, payload={}):
+        # Responses of the reference endpoints that rarely change, see cached_resources
+        self.http_cache = HttpCache(os.path.join(cache_dir, "http_cache")) if cache_dir is not None else None
+
+        # Project IDs are needed to get the other resources as well. They are
+        #   loaded on first use, see the projects property.
+        self._projects = None
+        # When the project list was fetched from the API (datetime), for the cached list as well
+        self.projects_fetched_at = None
+
+    @property
+    def projects(self):
+        """The projects, loaded from the cache or the API on first use"""
+        if self._projects is None:
+            self._projects = self._load_projects()
+        return self._projects
+
+    def _load_projects(self):
+        """Loads the projects from the project cache, or from the API when they aren't cached"""
+        if self.cache_dir is None:
+            self.projects_fetched_at = datetime.now()
+            return self.get_projects()
+
+        cache_key = hashlib.sha256(f"{self.base_url}|{self.access_token}|{self.cache_scope}".encode()).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"gitlab_projects_{cache_key[:16]}.json")
+        try:
+            modified_time = os.path.getmtime(cache_path)
+            if time.time() - modified_time < self.cache_ttl:
+                with open(cache_path) as cache_file:
+                    projects = json.load(cache_file)
+                self.projects_fetched_at = datetime.fromtimestamp(modified_time)
+                logging.info(f"{len(projects)} projects loaded from the project cache {cache_path}")
+                return projects
+        except CACHE_READ_ERRORS:
+            # Not cached (yet) or unreadable, the projects are fetched again
+            pass
+
+        fetch_start_time = time.time()
+        self.projects_fetched_at = datetime.fromtimestamp(fetch_start_time)
+        projects = self.get_projects()
+        try:
+            # Written to a temporary file first, so other tasks never read half a cache
+            temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temporary_path, "w") as cache_file:
+                json.dump(projects, cache_file)
+            # The modified time is the start of the fetch, the projects created after it may be missing
+            os.utime(temporary_path, (fetch_start_time, fetch_start_time))
+            os.replace(temporary_path, cache_path)
+        except OSError as e:
+            logging.warning(f"Could not write the project cache {cache_path}: {e}")
+        self._remove_expired_project_caches()
+        return projects
+
+    def _remove_expired_project_caches(self):
+        """Removes the project caches of earlier job runs, which are never read again"""
+        for file_name in os.listdir(self.cache_dir):
+            if not (file_name.startswith("gitlab_projects_") and file_name.endswith(".json")):
+                continue
+            path = os.path.join(self.cache_dir, file_name)
+            with contextlib.suppress(OSError):
+                if time.time() - os.path.getmtime(path) >= self.cache_ttl:
+                    os.remove(path)
+
+    def make_request(self, url, method, params, payload={}, retry_timeouts=True):
         """Make request
 
         Parameters:
-        url (string): The url the request should be made to
+        url (string): The url the request should be made to, relative to the base url or absolute
         method (string): The request method (e.g. POST GET)
         payload (json): The payload when a POST request is made
+        retry_timeouts (boolean): Retry the request when it times out, otherwise the Timeout is raised
 
         Returns:
         response object: response of the request made
         """
-        headers = {
-            "Accept": "application/json",
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.access_token}",
-        }
-        response = requests.request(
-            method,
-            f"{self.base_url}/{url}",
-            params=params,
-            data=payload,
-            headers=headers,
-        )
-        return response
+        if not url.startswith(("http://", "https://")):
+            url = f"{self.base_url}/{url}"
+
+        def send_request(headers=None):
+            return self.rate_limiter.request(
+                lambda: self.session.request(
+                    method,
+                    url,
+                    params=params,
+                    data=payload,
+                    headers=headers,
+                    timeout=self.request_timeout,
+                ),
+                url,
+                retry_timeouts,
+            )
+
+        if self.http_cache is not None and method == "GET" and urlparse(url).path.endswith(self.cached_resources):
+            return self.http_cache.request(send_request, url, params)
+        return send_request()
+
+    def close(self):
+        """Closes the connections to the Gitlab API."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def paginate_through_resource(
         self,
         resource_api,
         keys_to_keep,
-        params={},
+        params=None,
         overwrite=None,
-        per_page=50,
+        per_page=None,
+        keyset=False,
     ):
         """Paginate through resources
         Since the Gitlab API has pagination, this helper function will paginate through the resource API.
@@ -64,24 +248,117 @@ class Gitlab:
         Parameters:
         resource_api (string): The location of the resource requested
         keys_to_keep (list): List of keys returned by the API you want to keep
-        per_page (int): How many results per page you would like to get
+        per_page (int): How many results per page you would like to get. Defaults to the page size of the
+            resource type, see get_page_size
         simple (boolean): If the response of Gitlab should be simplified this needs to be set on True
         since (string): ISO formatted datetime string to indicate since which date you want values back (e.g. 2022-09-20T08:29:21)
         overwrite (dict): A dictionary with a key, value pair to overwrite the none value with a fixed value
+        keyset (boolean): Use keyset pagination, which stays fast for deep pages. Only some endpoints support it
+            (e.g. projects ordered by id), otherwise offset pagination is used.
 
         Returns:
         List of tuples with the values from the request
 
         """
+        pages = self.iter_pages(resource_api, keys_to_keep, params, overwrite, per_page, keyset)
+        return list(chain.from_iterable(pages))
+
+    def iter_pages(
+        self,
+        resource_api,
+        keys_to_keep,
+        params=None,
+        overwrite=None,
+        per_page=None,
+        keyset=False,
+    ):
+        """Iter pages
+        Generator version of paginate_through_resource: yields the cleaned values
+        of each page as soon as the page is received, so only one page at a time
+        is held in memory.
+
+        Parameters:
+        See paginate_through_resource
+
+        Returns:
+        generator: List of tuples with the values of each page
+        """
+        for json_response in self.iter_raw_pages(resource_api, params, per_page, keyset):
+            page_resources = []
+            for resource_object in json_response:
+                page_resources.append(self._clean_resource(resource_object, keys_to_keep, overwrite))
+            yield page_resources
+
+    def _clean_resource(self, resource_object, keys_to_keep, overwrite=None):
+        """Flattens and filters one object of a response and turns it into a list of values"""
+        cleaned_json = filter_dict(flatten_json(resource_object, legacy_list_handling=True), keys_to_keep)
+        final_json = fill_out_empty_keys(cleaned_json, keys_to_keep, overwrite)
+        return list(final_json.values())
+
+    def iter_raw_pages(self, resource_api, params=None, per_page=None, keyset=False):
+        """Iter raw pages
+        Paginates through the resource API and yields the objects of each page
+        as returned by Gitlab. Empty pages are skipped.
+
+        With adaptive paging the page size changes while paging. For offset
+        pagination the page number follows from the number of objects already
+        fetched, so the size only changes when that number is a multiple of the new size.
+
+        Parameters:
+        See paginate_through_resource
+
+        Returns:
+        generator: List of dicts with the objects of each page
+        """
+        resource_type = _get_resource_type(resource_api)
+        if per_page is None:
+            per_page = self.get_page_size(resource_type)
+
         next_page = "1"
+        next_url = None
+        # Number of objects on the previous pages
+        offset = 0
 
-        all_resources = []
+        # Copied, since the same params are used for all projects at the same time
+        params = dict(params or {})
+        if keyset:
+            params.update({"pagination": "keyset", "per_page": per_page})
 
         while len(next_page) != 0:
-            page_variables = {"per_page": per_page, "page": next_page}
-            params.update(page_variables)
-
-            response = self.make_request(resource_api, "GET", params=params)
+            if next_url is not None:
+                # The link of the next keyset page contains all params
+                request_url, request_params = _set_query_param(next_url, "per_page", per_page), None
+            else:
+                if keyset:
+                    params["per_page"] = per_page
+                else:
+                    page_variables = {"per_page": per_page, "page": offset // per_page + 1}
+                    params.update(page_variables)
+                request_url, request_params = resource_api, params
+
+            start_time = time.monotonic()
+            try:
+                response = self.make_request(
+                    request_url, "GET", params=request_params, retry_timeouts=not self.adaptive_paging
+                )
+            except requests.exceptions.Timeout:
+                self._add_page_stats(resource_type, timeouts=1)
+                if not self.adaptive_paging:
+                    # make_request already retried the timeouts
+                    raise
+                smaller_page_size = self._resize_page(resource_type, per_page, offset, keyset, larger=False)
+                if smaller_page_size != per_page:
+                    per_page = smaller_page_size
+                    continue
+                # The page can't get smaller, so the request is retried as it is
+                response = self.make_request(request_url, "GET", params=request_params)
+            seconds = time.monotonic() - start_time
+
+            if keyset and next_url is None and response.status_code in (400, 405):
+                logging.info(f"{resource_api}\n Keyset pagination not supported, using offset pagination.")
+                keyset = False
+                params.pop("pagination")
+                continue
 
             if response.status_code == 403:
                 logging.info(
@@ -96,15 +373,184 @@ class Gitlab:
             response.raise_for_status()
 
             json_response = response.json()
-
-            for resource_object in json_response:
-                cleaned_json = filter_dict(flatten_json(resource_object, legacy_list_handling=True), keys_to_keep)
-                final_json = fill_out_empty_keys(cleaned_json, keys_to_keep, overwrite)
-                all_resources.append(list(final_json.values()))
+            self._add_page_stats(resource_type, pages=1, objects=len(json_response), seconds=seconds)
+            offset += per_page
+            page_per_page = per_page
+            if self.adaptive_paging:
+                if seconds > self.request_timeout / 2:
+                    per_page = self._resize_page(resource_type, per_page, offset, keyset, larger=False)
+                elif seconds < self.fast_response_seconds and len(json_response) == per_page:
+                    per_page = self._resize_page(resource_type, per_page, offset, keyset, larger=True)
+
+            if json_response:
+                yield json_response
+
+            if keyset:
+                next_url = response.links.get("next", {}).get("url")
+                if next_url is not None:
+                    continue
+                # Without a next link this is either the last page, or Gitlab used
+                #   offset pagination because it doesn't support keyset for this request.
+                keyset = False
+                params.pop("pagination")
+                if per_page != page_per_page and offset % per_page != 0:
+                    per_page = page_per_page
 
             next_page = response.headers.get("X-Next-Page", "")
 
-        return all_resources
+    def get_page_size(self, resource_type):
+        """Get page size
+        Returns the number of objects per page for a resource type (e.g. "commits"),
+        as set in page_sizes or changed by adaptive paging.
+        """
+        if self.adaptive_paging and resource_type in self._adaptive_page_sizes:
+            return self._adaptive_page_sizes[resource_type]
+        return self.page_sizes.get(resource_type, self.default_page_size)
+
+    def _resize_page(self, resource_type, per_page, offset, keyset, larger):
+        """Returns the doubled or halved page size, or per_page when the size can't change"""
+        if larger:
+            new_per_page = min(per_page * 2, self.max_page_size)
+        else:
+            new_per_page = max(per_page // 2, self.min_page_size)
+
+        # The offset of the next page has to be a page boundary, keyset pages have no offset
+        if new_per_page == per_page or (not keyset and offset % new_per_page != 0):
+            return per_page
+
+        self._adaptive_page_sizes[resource_type] = new_per_page
+        logging.info(f"Page size of {resource_type} changed from {per_page} to {new_per_page}")
+        return new_per_page
+
+    def _add_page_stats(self, resource_type, pages=0, objects=0, seconds=0, timeouts=0):
+        """Adds to the page statistics of a resource type"""
+        with self._page_stats_lock:
+            stats = self.page_stats.setdefault(resource_type, {"pages": 0, "objects": 0, "seconds": 0, "timeouts": 0})
+            stats["pages"] += pages
+            stats["objects"] += objects
+            stats["seconds"] += seconds
+            stats["timeouts"] += timeouts
+
+    def log_page_stats(self):
+        """Log page stats
+        Logs the number of pages and objects fetched per resource type, with
+        the average latency of a page.
+        """
+        for resource_type, stats in sorted(self.page_stats.items()):
+            average_seconds = stats["seconds"] / stats["pages"] if stats["pages"] else 0
+            logging.info(
+                f"{resource_type}: {stats['pages']} pages with {stats['objects']} objects, "
+                f"{average_seconds:.2f} seconds per page, {stats['timeouts']} timeouts, "
+                f"page size {self.get_page_size(resource_type)}"
+            )
+
+    def fetch_per_project(self, fetch_project, only_active=False):
+        """Fetch per project
+        Calls fetch_project for every project, for up to `concurrency` projects
+        at the same time. The results are returned in the order of the projects.
+        When fetching a project fails, the error is logged and the project is
+        added to failed_projects, the other projects are still fetched.
+
+        Parameters:
+        fetch_project (function): Function that gets a project tuple and returns an iterable of pages
+        only_active (boolean): Skip the projects without activity since `since`, see get_active_projects
+
+        Returns:
+        List of tuples with the values of all projects
+        """
+        return list(chain.from_iterable(self.iter_per_project(fetch_project, only_active, ordered=True)))
+
+    def iter_per_project(self, fetch_project, only_active=False, with_project_id=False, ordered=False):
+        """Iter per project
+        Generator version of fetch_per_project: yields the pages of all projects
+        as soon as they are fetched, while the next projects are fetched in the
+        background, so a large project doesn't hold up the others. At most
+        `concurrency` projects are fetched at the same time, together at most a
+        few pages per project ahead, so memory stays bounded.
+        When fetching a project fails, the pages that were already yielded are
+        kept, the error is logged and the project is added to failed_projects.
+
+        Parameters:
+        fetch_project (function): Function that gets a project tuple and returns an iterable of pages
+        only_active (boolean): Skip the projects without activity since `since`, see get_active_projects
+        with_project_id (boolean): Yield one (project id, rows) tuple per project instead of pages,
+            with the rows of all its pages, so the caller can write every project in its own
+            transaction. A project is only yielded when all its pages were fetched.
+        ordered (boolean): Yield the pages in the order of the projects, instead of as soon as they
+            are fetched. The pages of a project are held back until the projects before it are
+            fetched, so only use it when all pages are collected anyway.
+
+        Returns:
+        generator: List of tuples with the values of each page
+        """
+        projects = self.get_active_projects() if only_active else self.projects
+        if self.skip_projects:
+            projects = [project for project in projects if str(project[0]) not in self.skip_projects]
+
+        if with_project_id:
+            fetch_pages = fetch_project
+
+            def fetch_project(project):
+                # A project that fails halfway is never yielded, so its rows aren't written
+                yield project[0], [row for page in fetch_pages(project) for row in page]
+
+        return iterate_concurrently(
+            projects,
+            fetch_project,
+            concurrency=self.concurrency,
+            on_error=self._project_failed,
+            ordered=ordered,
+        )
+
+    def _project_failed(self, project, error):
+        """Logs a project for which fetching a resource failed"""
+        project_id = project[0]
+        logging.error(f"Could not fetch the resources of project {project_id}: {error}")
+        self.failed_projects.append(project_id)
+
+    def _merge_request_failed(self, merge_request, error):
+        """Logs a merge request for which fetching the commits failed"""
+        project_id = merge_request[2]
+        logging.error(
+            f"Could not fetch the commits of merge request {merge_request[0]} of project {project_id}: {error}"
+        )
+        if project_id not in self.failed_projects:
+            self.failed_projects.append(project_id)
+
+    def get_since(self, project_id):
+        """Returns the date from which the data of a project is loaded: its project_since, or since"""
+        return self.project_since.get(str(project_id), self.since)
+
+    def _get_project_params(self, params, project_id):
+        """Returns the params with the since of the project, see get_since"""
+        if str(project_id) not in self.project_since:
+            return params
+        since = self.get_since(project_id)
+        return {key: since if key in ("since", "updated_after") else value for key, value in params.items()}
+
+    def get_active_projects(self):
+        """Get active projects
+        Returns the projects with activity since `since` (minus the activity
+        margin), or all projects when there's no since. Resources that are
+        loaded incrementally can't have changed in the other projects.
+
+        Returns:
+        List of tuples with the project values
+        """
+        if not self.since and not self.project_since:
+            return self.projects
+
+        # projects tuples have last_activity_at on index 15
+        active_projects = [project for project in self.projects if self._is_active(project)]
+        logging.info(f"{len(active_projects)} of {len(self.projects)} projects have activity since {self.since}")
+        return active_projects
+
+    def _is_active(self, project):
+        """Returns whether a project has activity since its since, minus the activity margin"""
+        since = self.get_since(project[0])
+        if not since or not project[15]:
+            return True
+        return _parse_datetime(project[15]) >= _parse_datetime(since) - self.activity_margin
 
     def get_projects_loaded(self):
         """Get projects
@@ -123,20 +569,41 @@ class Gitlab:
         keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["projects"].keys()
         resource_api = "projects"
 
-        params = {"order_by": "id"}
+        params = {"order_by": "id", "sort": "asc"}
 
-        all_projects = self.paginate_through_resource(resource_api, keys_to_keep, params)
+        all_projects = self.paginate_through_resource(resource_api, keys_to_keep, params, keyset=True)
         return all_projects
 
+    def iter_projects(self):
+        """Iter projects
+        The projects are loaded once per instance (or from the project cache),
+        so they are yielded as one page.
+
+        Returns:
+        generator: List of tuples with the project values
+        """
+        if self.projects:
+            yield self.projects
+
     def get_release_tags(self):
         """Get release tags
 
         Returns:
         List of tuples with the tags values from the API
         """
-        keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["tags"].keys()
+        return list(chain.from_iterable(self.iter_release_tags(ordered=True)))
 
-        all_tags = []
+    def iter_release_tags(self, with_project_id=False, ordered=False):
+        """Iter release tags
+
+        Parameters:
+        with_project_id (boolean): Yield (project id, rows) tuples per project, see iter_per_project
+        ordered (boolean): Yield the pages in the order of the projects, see iter_per_project
+
+        Returns:
+        generator: List of tuples with the tags values of each page
+        """
+        keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["tags"].keys()
 
         params = {
             "order_by": "name",
@@ -144,22 +611,25 @@ class Gitlab:
             "sort": "asc",
         }
 
-        for project in self.projects:
+        def iter_project_tags(project):
             project_id = project[0]
             # tags don't have a project_id in the response so we add it here
             overwrite = {"project_id": project_id}
 
             resource_api = f"projects/{project_id}/repository/tags"
-            tag_in_tuple = self.paginate_through_resource(
+            return self.iter_pages(
                 resource_api,
                 keys_to_keep,
-                params,
+                self._get_project_params(params, project_id),
                 overwrite=overwrite,
             )
 
-            all_tags.extend(tag_in_tuple)
-
-        return all_tags
+        return self.iter_per_project(
+            iter_project_tags,
+            only_active="tags" in self.skip_inactive_projects,
+            with_project_id=with_project_id,
+            ordered=ordered,
+        )
 
     def get_issues(self):
         """Get issues
@@ -167,24 +637,38 @@ class Gitlab:
         Returns:
         List of tuples with the issues values from the API
         """
-        keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["issues"].keys()
+        return list(chain.from_iterable(self.iter_issues(ordered=True)))
+
+    def iter_issues(self, with_project_id=False, ordered=False):
+        """Iter issues
 
-        all_issues = []
+        Parameters:
+        with_project_id (boolean): Yield (project id, rows) tuples per project, see iter_per_project
+        ordered (boolean): Yield the pages in the order of the projects, see iter_per_project
+
+        Returns:
+        generator: List of tuples with the issues values of each page
+        """
+        keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["issues"].keys()
 
         params = {
             "order_by": "created_at",
             "updated_after": self.since,
             "sort": "asc",
         }
+
         # projects is a list of tuples, so the first item in the tuple is the id
-        for project in self.projects:
+        def iter_project_issues(project):
             project_id = project[0]
             resource_api = f"projects/{project_id}/issues"
+            return self.iter_pages(resource_api, keys_to_keep, self._get_project_params(params, project_id))
 
-            project_issues = self.paginate_through_resource(resource_api, keys_to_keep, params)
-            all_issues.extend(project_issues)
-
-        return all_issues
+        return self.iter_per_project(
+            iter_project_issues,
+            only_active="issues" in self.skip_inactive_projects,
+            with_project_id=with_project_id,
+            ordered=ordered,
+        )
 
     def get_pipelines(self):
         """Get pipelines
@@ -192,8 +676,18 @@ class Gitlab:
         Returns:
         List of tuples with the pipelines values from the API
         """
-        all_pipelines = []
+        return list(chain.from_iterable(self.iter_pipelines(ordered=True)))
+
+    def iter_pipelines(self, with_project_id=False, ordered=False):
+        """Iter pipelines
+
+        Parameters:
+        with_project_id (boolean): Yield (project id, rows) tuples per project, see iter_per_project
+        ordered (boolean): Yield the pages in the order of the projects, see iter_per_project
 
+        Returns:
+        generator: List of tuples with the pipelines values of each page
+        """
         params = {
             "order_by": "id",
             "updated_after": self.since,
@@ -201,23 +695,42 @@ class Gitlab:
         }
 
         keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["pipelines"].keys()
+
         # projects is a list of tuples, so the first item in the tuple is the id
-        for project in self.projects:
+        def iter_project_pipelines(project):
             project_id = project[0]
             resource_api = f"projects/{project_id}/pipelines"
-            project_pipelines = self.paginate_through_resource(resource_api, keys_to_keep, params)
-            all_pipelines.extend(project_pipelines)
+            return self.iter_pages(resource_api, keys_to_keep, self._get_project_params(params, project_id))
 
-        return all_pipelines
+        # Scheduled pipelines and status changes don't update last_activity_at, so inactive projects aren't skipped
+        return self.iter_per_project(iter_project_pipelines, with_project_id=with_project_id, ordered=ordered)
 
-    def get_merge_requests(self):
+    def get_merge_requests(self, only_active=None):
         """Get merge requests
 
+        Parameters:
+        only_active (boolean): See iter_merge_requests
+
         Returns:
         List of tuples with the merge request values from the API
         """
-        all_merge_requests = []
+        merge_requests = list(chain.from_iterable(self.iter_merge_requests(ordered=True, only_active=only_active)))
+        # Kept, so get_merge_request_commits doesn't need to fetch them again
+        self.merge_requests = merge_requests
+        return merge_requests
+
+    def iter_merge_requests(self, with_project_id=False, ordered=False, only_active=None):
+        """Iter merge requests
 
+        Parameters:
+        with_project_id (boolean): Yield (project id, rows) tuples per project, see iter_per_project
+        ordered (boolean): Yield the pages in the order of the projects, see iter_per_project
+        only_active (boolean): Skip the inactive projects, see iter_per_project. Defaults to
+            whether merge_requests is in skip_inactive_projects.
+
+        Returns:
+        generator: List of tuples with the merge request values of each page
+        """
         params = {
             "order_by": "title",
             "updated_after": self.since,
@@ -225,14 +738,22 @@ class Gitlab:
         }
 
         keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["merge_requests"].keys()
+
         # projects is a list of tuples, so the first item in the tuple is the id
-        for project in self.projects:
+        def iter_project_merge_requests(project):
             project_id = project[0]
             resource_api = f"projects/{project_id}/merge_requests"
-            project_merge_requests = self.paginate_through_resource(resource_api, keys_to_keep, params)
-            all_merge_requests.extend(project_merge_requests)
+            return self.iter_pages(resource_api, keys_to_keep, self._get_project_params(params, project_id))
 
-        return all_merge_requests
+        if only_active is None:
+            only_active = "merge_requests" in self.skip_inactive_projects
+
+        return self.iter_per_project(
+            iter_project_merge_requests,
+            only_active=only_active,
+            with_project_id=with_project_id,
+            ordered=ordered,
+        )
 
     def get_commits(self):
         """Get commits
@@ -240,8 +761,18 @@ class Gitlab:
         Returns:
         List of tuples with the commits values from the API
         """
-        all_commits = []
+        return list(chain.from_iterable(self.iter_commits(ordered=True)))
+
+    def iter_commits(self, with_project_id=False, ordered=False):
+        """Iter commits
 
+        Parameters:
+        with_project_id (boolean): Yield (project id, rows) tuples per project, see iter_per_project
+        ordered (boolean): Yield the pages in the order of the projects, see iter_per_project
+
+        Returns:
+        generator: List of tuples with the commits values of each page
+        """
         params = {
             "order": "default",
             "since": self.since,
@@ -249,32 +780,69 @@ class Gitlab:
         }
 
         keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["commits"].keys()
-        # tags don't have a project_id in the response so we add it here
 
         # projects is a list of tuples, so the first item in the tuple is the id
-        for project in self.projects:
+        def iter_project_commits(project):
             project_id = project[0]
+            # commits don't have a project_id in the response so we add it here
             overwrite = {"project_id": project_id}
             resource_api = f"projects/{project_id}/repository/commits"
-            project_commits = self.paginate_through_resource(
+            return self.iter_pages(
                 resource_api,
                 keys_to_keep,
-                params,
+                self._get_project_params(params, project_id),
                 overwrite=overwrite,
             )
-            all_commits.extend(project_commits)
 
-        return all_commits
+        return self.iter_per_project(
+            iter_project_commits,
+            only_active="commits" in self.skip_inactive_projects,
+            with_project_id=with_project_id,
+            ordered=ordered,
+        )
 
-    def get_merge_request_commits(self):
+    def get_merge_request_commits(self, merge_requests=None):
         """Get merge request commits
 
+        Parameters:
+        merge_requests (list): See iter_merge_request_commits
+
         Returns:
         List of tuples with the commits values from the API
         """
-        all_merge_requests = self.get_merge_requests()
+        return list(chain.from_iterable(self.iter_merge_request_commits(merge_requests, ordered=True)))
+
+    def iter_merge_request_commits(self, merge_requests=None, with_project_id=False, ordered=False):
+        """Iter merge request commits
+        Only the commits of merge requests that were updated since `since` are
+        fetched, since the commits of the other merge requests can't have
+        changed. The merge requests are fetched `concurrency` at a time.
+
+        Parameters:
+        merge_requests (list): Merge requests (as returned by get_merge_requests) to get the
+            commits of. Defaults to the merge requests already fetched by this instance, or
+            fetches them when there are none. These are fetched with updated_after=since, so
+            they only hold the merge requests that were updated since `since`.
+        with_project_id (boolean): Yield (project id, rows) tuples per project, see iter_per_project.
+            The commits of the merge requests of a project are then fetched one merge request at a time.
+        ordered (boolean): Yield the pages in the order of the merge requests, see iter_per_project
+
+        Returns:
+        generator: List of tuples with the commits values of each page
+        """
+        if merge_requests is None and self.merge_requests is not None:
+            merge_requests = self.merge_requests
+        elif merge_requests is None:
+            # Crawled for the merge request commits, so that load type decides whether inactive projects are skipped
+            merge_requests = self.get_merge_requests(
+                only_active="merge_request_commits" in self.skip_inactive_projects
+            )
 
-        all_commits = []
+        # merge requests tuples have the project id on index 2
+        updated_merge_requests = [
+            merge_request for merge_request in merge_requests if str(merge_request[2]) not in self.skip_projects
+        ]
+        logging.info(f"Fetching the commits of {len(updated_merge_requests)} merge requests")
 
         params = {
             "order": "default",
@@ -284,66 +852,201 @@ class Gitlab:
 
         keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["merge_request_commits"].keys()
 
-        for merge_request in all_merge_requests:
+        def iter_commits_of_merge_request(merge_request):
             mr_iid = merge_request[1]
             project_id = merge_request[2]
             overwrite = {"project_id": project_id, "merge_request_id": merge_request[0]}
 
             resource_api = f"projects/{project_id}/merge_requests/{mr_iid}/commits"
-            merge_request_commits_commits = self.paginate_through_resource(
+            return self.iter_pages(
                 resource_api,
                 keys_to_keep,
-                params,
+                self._get_project_params(params, project_id),
                 overwrite=overwrite,
             )
-            all_commits.extend(merge_request_commits_commits)
 
-        return all_commits
+        if with_project_id:
+            merge_requests_per_project = {}
+            for merge_request in updated_merge_requests:
+                merge_requests_per_project.setdefault(merge_request[2], []).append(merge_request)
+
+            def iter_commits_of_project(project_merge_requests):
+                # A project of which a merge request fails is never yielded, so its rows aren't written
+                project_id, merge_requests = project_merge_requests
+                rows = [
+                    row
+                    for merge_request in merge_requests
+                    for page in iter_commits_of_merge_request(merge_request)
+                    for row in page
+                ]
+                yield project_id, rows
+
+            return iterate_concurrently(
+                list(merge_requests_per_project.items()),
+                iter_commits_of_project,
+                concurrency=self.concurrency,
+                on_error=self._project_failed,
+                ordered=ordered,
+            )
+
+        return iterate_concurrently(
+            updated_merge_requests,
+            iter_commits_of_merge_request,
+            concurrency=self.concurrency,
+            on_error=self._merge_request_failed,
+            ordered=ordered,
+        )
 
-    def get_commits_with_branch_name(self):
+    def get_commits_with_branch_name(self, deduplicate=True):
         """Get commits
 
+        Parameters:
+        deduplicate (boolean): See iter_commits_with_branch_name
+
         Returns:
         List of tuples with the commits values from the API
         """
-        all_commits = []
+        return list(chain.from_iterable(self.iter_commits_with_branch_name(deduplicate, ordered=True)))
 
-        params = {
-            "order_by": "default",
-            "updated_after": self.since,
-            "sort": "asc",
-        }
+    def iter_commits_with_branch_name(self, deduplicate=True, with_project_id=False, ordered=False):
+        """Iter commits with branch name
+        Returns a row per commit per branch that contains it.
+
+        With deduplicate, the commits of a project are downloaded only once: the
+        default branch is crawled first and the crawl of every other branch stops
+        as soon as the rest of its history consists of commits that are already
+        known. For those commits only the branch rows are added, using the
+        parent_ids of the commits. Without deduplicate the full history of every
+        branch is downloaded.
 
-        for project in self.projects:
+        Parameters:
+        deduplicate (boolean): Download shared commits only once per project
+        with_project_id (boolean): Yield (project id, rows) tuples per project, see iter_per_project
+        ordered (boolean): Yield the pages in the order of the projects, see iter_per_project
+
+        Returns:
+        generator: List of tuples with the commits values of each page
+        """
+        keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["branch_commits"].keys()
+
+        def iter_project_commits_with_branch_name(project):
             project_id = project[0]
 
             resource_api = f"projects/{project_id}/repository/branches"
-
-            keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["branches"].keys()
             project_branches = self.paginate_through_resource(
                 resource_api,
-                keys_to_keep,
+                COLUMN_NAMES_AND_DATA_TYPES["branches"].keys(),
             )
 
+            if deduplicate:
+                # branches tuples have the name on index 1 and default on index 4
+                project_branches.sort(key=lambda branch: not branch[4])
+                yield from self._iter_deduplicated_branch_commits(project_id, project_branches, keys_to_keep)
+                return
+
             for branch in project_branches:
                 branch_name = branch[1]
                 overwrite = {"branch_name": branch_name, "project_id": project_id}
-                keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["branch_commits"].keys()
                 params = {
                     "order": "default",
-                    "since": self.since,
+                    "since": self.get_since(project_id),
                     "ref_name": branch_name,
                 }
                 resource_api = f"projects/{project_id}/repository/commits"
-                project_commits = self.paginate_through_resource(
+                yield from self.iter_pages(
                     resource_api,
                     keys_to_keep,
                     params,
                     overwrite=overwrite,
                 )
-                all_commits.extend(project_commits)
 
-        return all_commits
+        return self.iter_per_project(
+            iter_project_commits_with_branch_name,
+            only_active="branch_commits" in self.skip_inactive_projects,
+            with_project_id=with_project_id,
+            ordered=ordered,
+        )
+
+    def _iter_deduplicated_branch_commits(self, project_id, branches, keys_to_keep):
+        """Iter deduplicated branch commits
+        Crawls the commits of the branches of a project, downloading every commit
+        only once. See iter_commits_with_branch_name.
+
+        Parameters:
+        project_id (int): The id of the project
+        branches (list): Tuples of the branches, in the order they should be crawled
+        keys_to_keep (list): List of keys of the branch commits
+
+        Returns:
+        generator: List of tuples with the commits values of each page
+        """
+        branch_name_index = list(keys_to_keep).index("branch_name")
+        resource_api = f"projects/{project_id}/repository/commits"
+
+        # Commits that are known, with their values and parents. The history (since `since`)
+        #   of a known commit is always known as well.
+        commits = {}
+        parents = {}
+        # Parents that are not in the commits since `since`
+        outside_commits = set()
+
+        def add_known_history(sha, branch_name, branch_commits, rows):
+            # Adds a branch row for a known commit and its history
+            stack = [sha]
+            while stack:
+                sha = stack.pop()
+                if sha in branch_commits or sha not in commits:
+                    continue
+                branch_commits.add(sha)
+                row = list(commits[sha])
+                row[branch_name_index] = branch_name
+                rows.append(row)
+                stack.extend(parents[sha])
+
+        for branch in branches:
+            branch_name = branch[1]
+            overwrite = {"branch_name": branch_name, "project_id": project_id}
+            params = {
+                "order": "default",
+                "since": self.get_since(project_id),
+                "ref_name": branch_name,
+            }
+
+            branch_commits = set()
+            # Parents of new commits that aren't known or seen on this branch yet
+            pending_parents = set()
+
+            for page in self.iter_raw_pages(resource_api, params):
+                rows = []
+                for commit in page:
+                    sha = commit["id"]
+                    if sha in commits:
+                        add_known_history(sha, branch_name, branch_commits, rows)
+                        continue
+                    if sha in branch_commits:
+                        continue
+
+                    row = self._clean_resource(commit, keys_to_keep, overwrite)
+                    commits[sha] = row
+                    parents[sha] = commit.get("parent_ids") or []
+                    branch_commits.add(sha)
+                    rows.append(row)
+
+                    for parent in parents[sha]:
+                        if parent in commits:
+                            add_known_history(parent, branch_name, branch_commits, rows)
+                        elif parent not in outside_commits:
+                            pending_parents.add(parent)
+
+                pending_parents -= branch_commits
+                if rows:
+                    yield rows
+                if not pending_parents:
+                    # The rest of the history of this branch is known
+                    break
+            else:
+                # The whole branch was crawled, so the parents that weren't found are older than `since`
+                outside_commits.update(pending_parents)
 
     def get_branches(self):
         """Get branches
@@ -351,18 +1054,51 @@ class Gitlab:
         Returns:
         List of tuples with the branches of the specific projects from the API
         """
+        return list(chain.from_iterable(self.iter_branches(ordered=True)))
+
+    def iter_branches(self, with_project_id=False, ordered=False):
+        """Iter branches
+
+        Parameters:
+        with_project_id (boolean): Yield (project id, rows) tuples per project, see iter_per_project
+        ordered (boolean): Yield the pages in the order of the projects, see iter_per_project
+
+        Returns:
+        generator: List of tuples with the branches values of each page
+        """
         keys_to_keep = COLUMN_NAMES_AND_DATA_TYPES["branches"].keys()
-        all_branches = []
 
-        for project in self.projects:
+        def iter_project_branches(project):
             project_id = project[0]
             overwrite = {"project_id": project_id}
             resource_api = f"projects/{project_id}/repository/branches"
-            project_branches = self.paginate_through_resource(
+            return self.iter_pages(
                 resource_api,
                 keys_to_keep,
                 overwrite=overwrite,
             )
-            all_branches.extend(project_branches)
 
-        return all_branches
+        # Branches aren't loaded incrementally, so all projects are needed
+        return self.iter_per_project(iter_project_branches, with_project_id=with_project_id, ordered=ordered)
+
+
+def _parse_datetime(value):
+    """Parses a datetime string. Datetimes without timezone are taken as UTC, as Gitlab does."""
+    parsed = parse(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=UTC)
+    return parsed
+
+
+def _get_resource_type(resource_api):
+    """Returns the resource type of a resource url: its last part that isn't an id (e.g. "commits")"""
+    parts = [part for part in urlparse(resource_api).path.split("/") if part and not part.isdigit()]
+    return parts[-1] if parts else resource_api
+
+
+def _set_query_param(url, name, value):
+    """Returns the url with a query param replaced"""
+    parsed_url = urlparse(url)
+    query = [(key, val) for key, val in parse_qsl(parsed_url.query) if key != name]
+    query.append((name, str(value)))
+    return parsed_url._replace(query=urlencode(query)).geturl()
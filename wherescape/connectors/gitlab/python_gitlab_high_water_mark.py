@@ -10,7 +10,8 @@ def gitlab_next_high_water_mark():
     high water mark. As the high water mark date value is shared over all
     Gitlab objects, this needs to be determined before the first object is
     being loaded. This date value will be stored seperately until the job
-    has finished.
+    has finished. The shared mark is used by the load types that don't have
+    their own high water mark yet, see gitlab_load_data.
     """
     wherescape_instance = WhereScape()
     next_high_water_mark = datetime.today().isoformat(timespec="seconds")
@@ -1,14 +1,24 @@
+import json
 import logging
 import os
 from datetime import datetime
+from itertools import chain
 
-from ... import WhereScape
-from ...helper_functions import create_column_names
+from ... import LoadCheckpoint, LoadTableWriter, WhereScape
 from . import Gitlab
 from .gitlab_data_types_column_names import COLUMN_NAMES_AND_DATA_TYPES
 
 
-def gitlab_load_data_smart(is_legacy=False):
+def gitlab_load_data_smart(
+    is_legacy=False,
+    load_method=None,
+    concurrency=4,
+    page_sizes=None,
+    adaptive_paging=False,
+    per_project_high_water_marks=False,
+    resumable=False,
+    skip_inactive_projects=False,
+):
     """
     Function to load the data for Gitlab objects. Will look at the load table
     names to determine the object type. So in order for this funtion towork as
@@ -21,6 +31,22 @@ def gitlab_load_data_smart(is_legacy=False):
             uses create_column_names() which only adds numbers when needed for
             uniqueness. Set to True for existing tables that were created with
             the legacy naming convention. Defaults to False.
+        load_method (str): How the rows are loaded into the load table, see
+            WhereScape.bulk_load_to_target. One of "executemany",
+            "fast_executemany", "values" or "copy", or "fastest" for the fastest
+            method available. Defaults to "executemany".
+        concurrency (int): Number of Gitlab projects that are fetched at the
+            same time. Defaults to 4.
+        page_sizes (dict): Number of objects per page by resource type, e.g.
+            {"commits": 50}. Defaults to 100, the maximum of Gitlab.
+        adaptive_paging (bool): Adjust the page sizes to the response times of
+            Gitlab. Defaults to False.
+        per_project_high_water_marks (bool): Keep the high water mark of the
+            projects that failed, see gitlab_load_data. Defaults to False.
+        resumable (bool): Resume a load that crashed, see gitlab_load_data.
+            Defaults to False.
+        skip_inactive_projects (bool): Skip the projects without activity since
+            the high water mark, see gitlab_load_data. Defaults to False.
     """
     wherescape_instance = WhereScape()
 
@@ -46,14 +72,43 @@ def gitlab_load_data_smart(is_legacy=False):
     else:
         raise Exception("Could not find the specific Gitlab object type")
 
-    gitlab_load_data(wherescape_instance, load_type, is_legacy)
+    gitlab_load_data(
+        wherescape_instance,
+        load_type,
+        is_legacy,
+        load_method,
+        concurrency,
+        page_sizes,
+        adaptive_paging,
+        per_project_high_water_marks,
+        resumable,
+        skip_inactive_projects,
+    )
 
 
-def gitlab_load_data(wherescape_instance, load_type, is_legacy=False):
+def gitlab_load_data(
+    wherescape_instance,
+    load_type,
+    is_legacy=False,
+    load_method=None,
+    concurrency=4,
+    page_sizes=None,
+    adaptive_paging=False,
+    per_project_high_water_marks=False,
+    resumable=False,
+    skip_inactive_projects=False,
+):
     """
     Main Gitlab load data function. Loads data from Gitlab and pushes it to
     the warehouse. This is the glue between the gitlab_wrapper and WhereScape.
 
+    Every load type has its own high water mark, the gitlab_high_water_mark_<load_type>
+    parameter (e.g. gitlab_high_water_mark_issues). Without it the shared
+    gitlab_high_water_mark is used. The mark is set to the start of the load
+    once the load has been written, so a failed load is retried from its old mark.
+    When the project list was fetched before the load started (it's cached per
+    job run), the mark is set to the time the project list was fetched instead.
+
     Args:
         wherescape_instance (WhereScape): WhereScape instance for database operations
         load_type (str): Type of GitLab object to load (e.g., "projects", "issues",
@@ -63,6 +118,36 @@ def gitlab_load_data(wherescape_instance, load_type, is_legacy=False):
             uses create_column_names() which only adds numbers when needed for
             uniqueness. Set to True for existing tables that were created with
             the legacy naming convention. Defaults to False.
+        load_method (str): How the rows are loaded into the load table, see
+            WhereScape.bulk_load_to_target. One of "executemany",
+            "fast_executemany", "values" or "copy", or "fastest" for the fastest
+            method available. Defaults to "executemany".
+        concurrency (int): Number of Gitlab projects that are fetched at the
+            same time. Defaults to 4.
+        page_sizes (dict): Number of objects per page by resource type, e.g.
+            {"commits": 50}. Defaults to 100, the maximum of Gitlab.
+        adaptive_paging (bool): Adjust the page sizes to the response times of
+            Gitlab. Defaults to False.
+        per_project_high_water_marks (bool): When some projects fail, the high
+            water mark of the load type is still moved and the old marks of the
+            failed projects are kept in the gitlab_high_water_mark_<load_type>_projects
+            parameter (as JSON), so only those projects are loaded from their old
+            mark in the next load. Otherwise the high water mark of the load type
+            isn't moved when a project fails. Defaults to False.
+        resumable (bool): Write every project in its own transaction and keep the
+            written projects in a checkpoint in the workdir (see LoadCheckpoint),
+            so a load that crashed continues with the projects that weren't written
+            yet when it's run again. A project is only written when all its pages
+            were fetched. The checkpoint is discarded when the load finishes, also
+            when some projects failed: the next load fetches those again from
+            their high water mark (see per_project_high_water_marks), like a load
+            that isn't resumable. Doesn't apply to projects. Defaults to False.
+        skip_inactive_projects (bool): Only fetch the projects with a
+            last_activity_at since the high water mark (minus a margin). Saves a
+            request per project when few projects changed, but only use it for
+            load types of which every change updates last_activity_at (e.g.
+            issues or commits). Doesn't apply to pipelines and branches.
+            Defaults to False.
     """
     start_time = datetime.now()
     logging.info(f"Start time: {start_time.strftime('%Y-%m-%d %H:%M:%S')} for gitlab_load_data")
@@ -71,61 +156,128 @@ def gitlab_load_data(wherescape_instance, load_type, is_legacy=False):
     access_token = os.getenv("WSL_SRCCFG_APIKEY")
     table_name = wherescape_instance.load_full_name
 
-    since = wherescape_instance.read_parameter("gitlab_high_water_mark")
-    gitlab_instance = Gitlab(access_token, base_url, since)
+    high_water_mark_name = f"gitlab_high_water_mark_{load_type}"
+    since = wherescape_instance.read_parameter(high_water_mark_name) or wherescape_instance.read_parameter(
+        "gitlab_high_water_mark"
+    )
+    project_since = {}
+    if per_project_high_water_marks:
+        project_high_water_marks = wherescape_instance.read_parameter(f"{high_water_mark_name}_projects")
+        project_since = json.loads(project_high_water_marks) if project_high_water_marks else {}
+
+    # The dss_load_date and the next high water mark of a resumed load are those of the run that started it
+    load_date = start_time
+    checkpoint = None
+    if resumable and load_type != "projects":
+        checkpoint = LoadCheckpoint(wherescape_instance, f"gitlab_{load_type}", start_time, table_name)
+        load_date = checkpoint.load_date
 
     columns = COLUMN_NAMES_AND_DATA_TYPES[load_type]
-    if load_type == "projects":
-        values = gitlab_instance.get_projects()
-    elif load_type == "pipelines":
-        values = gitlab_instance.get_pipelines()
-    elif load_type == "issues":
-        values = gitlab_instance.get_issues()
-    elif load_type == "tags":
-        values = gitlab_instance.get_release_tags()
-    elif load_type == "merge_request_commits":
-        values = gitlab_instance.get_merge_request_commits()
-    elif load_type == "merge_requests":
-        values = gitlab_instance.get_merge_requests()
-    elif load_type == "branch_commits":
-        values = gitlab_instance.get_commits_with_branch_name()
-    elif load_type == "commits":
-        values = gitlab_instance.get_commits()
-    elif load_type == "branches":
-        values = gitlab_instance.get_branches()
-    else:
-        raise Exception("Wrong gitlab load type supplied")
+    writer = LoadTableWriter(
+        wherescape_instance,
+        "gitlab api - " + load_type,
+        fields=columns,
+        table_name=table_name,
+        load_date=load_date,
+        load_method=load_method,
+        is_legacy=is_legacy,
+    )
 
-    if len(values) > 0:
-        if not is_legacy:
-            columns = create_column_names(columns)
+    # The project list is cached in the workdir, so the other Gitlab load tasks of the job run can reuse it
+    with Gitlab(
+        access_token,
+        base_url,
+        since,
+        concurrency=concurrency,
+        cache_dir=wherescape_instance.workdir,
+        cache_scope=f"{wherescape_instance.job_key}|{wherescape_instance.sequence}",
+        page_sizes=page_sizes,
+        adaptive_paging=adaptive_paging,
+        project_since=project_since,
+        skip_inactive_projects=(load_type,) if skip_inactive_projects else (),
+        skip_projects=checkpoint.completed if checkpoint is not None else None,
+    ) as gitlab_instance:
+        # Pages are written while the next ones are fetched. For a checkpoint the
+        #   rows come per project, with the project id.
+        with_project_id = checkpoint is not None
+        if load_type == "projects":
+            pages = gitlab_instance.iter_projects()
+        elif load_type == "pipelines":
+            pages = gitlab_instance.iter_pipelines(with_project_id)
+        elif load_type == "issues":
+            pages = gitlab_instance.iter_issues(with_project_id)
+        elif load_type == "tags":
+            pages = gitlab_instance.iter_release_tags(with_project_id)
+        elif load_type == "merge_request_commits":
+            pages = gitlab_instance.iter_merge_request_commits(with_project_id=with_project_id)
+        elif load_type == "merge_requests":
+            pages = gitlab_instance.iter_merge_requests(with_project_id)
+        elif load_type == "branch_commits":
+            pages = gitlab_instance.iter_commits_with_branch_name(with_project_id=with_project_id)
+        elif load_type == "commits":
+            pages = gitlab_instance.iter_commits(with_project_id)
+        elif load_type == "branches":
+            pages = gitlab_instance.iter_branches(with_project_id)
         else:
-            from ...helper_functions import create_legacy_column_names
-
-            columns = create_legacy_column_names(columns)
-        columns.append("dss_record_source")
-        columns.append("dss_load_date")
+            raise Exception("Wrong gitlab load type supplied")
 
-        rows = []
-        for row in values:
-            row.append("gitlab api - " + load_type)
-            row.append(start_time)
-
-            rows.append(row)
-
-        # Prepare the sql
-        column_names_string = ",".join(column for column in columns)
-        question_mark_string = ",".join("?" for _ in columns)
-        sql = f"INSERT INTO {table_name} ({column_names_string}) VALUES ({question_mark_string})"
+        if checkpoint is None:
+            row_count = writer.write(chain.from_iterable(pages))
+        else:
+            row_count = _write_per_project(writer, pages, checkpoint)
+        gitlab_instance.log_page_stats()
 
-        # Execute the sql
-        wherescape_instance.push_many_to_target(sql, rows)
-        logging.info(f"{len(rows)} rows successfully inserted in {table_name}")
-        wherescape_instance.main_message = f"{load_type.capitalize()} successfully loaded {len(rows)} rows"
+    if row_count > 0:
+        logging.info(f"{row_count} rows successfully inserted in {table_name}")
+        wherescape_instance.main_message = f"{load_type.capitalize()} successfully loaded {row_count} rows"
     else:
         logging.info(f"No modified values found for {load_type.capitalize()}")
         wherescape_instance.main_message = f"No modified values found for {load_type.capitalize()}"
 
+    if gitlab_instance.failed_projects:
+        failed_projects = ", ".join(str(project_id) for project_id in gitlab_instance.failed_projects)
+        logging.error(f"{load_type.capitalize()} of these projects could not be loaded: {failed_projects}")
+
+    # Everything updated since the start of this load is loaded again in the next load. When the
+    #   project list was fetched earlier (it's cached per job run), the projects created since
+    #   then weren't crawled, so the mark is set to the time the project list was fetched.
+    next_high_water_mark = load_date
+    if gitlab_instance.projects_fetched_at is not None:
+        next_high_water_mark = min(next_high_water_mark, gitlab_instance.projects_fetched_at)
+    next_high_water_mark = next_high_water_mark.isoformat(timespec="seconds")
+    if per_project_high_water_marks:
+        # The failed projects keep the mark they were loaded from
+        project_since = {
+            str(project_id): gitlab_instance.get_since(project_id) for project_id in gitlab_instance.failed_projects
+        }
+        wherescape_instance.write_parameter(f"{high_water_mark_name}_projects", json.dumps(project_since))
+        wherescape_instance.write_parameter(high_water_mark_name, next_high_water_mark)
+        logging.info(f"High water mark {high_water_mark_name} is set to {next_high_water_mark}")
+    elif gitlab_instance.failed_projects:
+        logging.warning(f"High water mark {high_water_mark_name} is left at {since}, since some projects failed")
+    else:
+        wherescape_instance.write_parameter(high_water_mark_name, next_high_water_mark)
+        logging.info(f"High water mark {high_water_mark_name} is set to {next_high_water_mark}")
+
+    if checkpoint is not None:
+        # Failed projects are retried by the next load from their high water mark, not resumed
+        checkpoint.finish()
+
     # Final logging
     end_time = datetime.now()
     logging.info(f"Time elapsed: {(end_time - start_time).seconds} seconds for gitlab_load_data")
+
+
+def _write_per_project(writer, project_rows, checkpoint):
+    """
+    Writes (project id, rows) tuples, each project in one transaction, and
+    commits every project to the checkpoint. Projects that failed aren't
+    yielded by the Gitlab instance, so none of their rows are written and a
+    resumed load fetches them again.
+
+    Returns:
+    int: Number of rows written by all runs of the load
+    """
+    for project_id, rows in project_rows:
+        checkpoint.commit(writer.write(rows, atomic=True), [project_id])
+    return checkpoint.row_count
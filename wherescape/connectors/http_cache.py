@@ -0,0 +1,209 @@
+"""
+Module with the HTTP response cache of the REST connectors.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+# Headers that describe the body, which are kept from the cached response
+_BODY_HEADERS = ("content-length", "content-type", "content-encoding", "transfer-encoding")
+
+# Errors of reading a cache file that is missing, removed by another process or not valid JSON
+CACHE_READ_ERRORS = (OSError, ValueError)
+
+
+class HttpCache:
+    """
+    On disk cache of GET responses that are revalidated with the server.
+
+    A response with an ETag or Last-Modified header is stored with its headers.
+    The next request for the same url and params sends If-None-Match and
+    If-Modified-Since, and when the server answers 304 (not modified) the stored
+    response is returned, so unchanged data isn't downloaded again.
+
+    The cache is bounded to max_size bytes. When it grows larger, the least
+    recently used responses are removed.
+
+    Example:
+    http_cache = HttpCache(os.path.join(wherescape_instance.workdir, "http_cache"))
+    response = http_cache.request(lambda headers: session.get(url, headers=headers), url)
+    """
+
+    def __init__(self, cache_dir, max_size=50 * 1024 * 1024):
+        """
+        Initialises the cache.
+
+        Parameters:
+        cache_dir (string): Directory the responses are stored in, created when missing
+        max_size (int): Maximum size of the cache in bytes
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+        # Number of requests answered from the cache
+        self.hit_count = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._list_entries())
+
+    def request(self, send_request, url, params=None):
+        """
+        Sends a conditional GET request when the response is cached, and
+        returns the cached response when the server answers 304.
+
+        Parameters:
+        send_request (function): Function that sends the request with a dict of extra headers
+        url (string): The url of the request
+        params (dict): The query params of the request
+
+        Returns:
+        response object: the response of the server, or the cached response
+        """
+        key = _get_key(url, params)
+        entry = self._read(key)
+
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = send_request(headers)
+
+        if response.status_code == 304 and entry is not None:
+            with self._lock:
+                self.hit_count += 1
+            logging.debug(f"{url} not modified, using the cached response")
+            return _build_response(entry, response)
+
+        if response.status_code == 200:
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self._write(key, response, etag, last_modified)
+        return response
+
+    def _get_paths(self, key):
+        """Returns the paths of the metadata and the body of a cached response"""
+        base_path = os.path.join(self.cache_dir, key)
+        return f"{base_path}.json", f"{base_path}.body"
+
+    def _read(self, key):
+        """Returns the cached response with the key, or None when it isn't cached"""
+        meta_path, body_path = self._get_paths(key)
+        try:
+            with open(meta_path) as meta_file:
+                entry = json.load(meta_file)
+            with open(body_path, "rb") as body_file:
+                entry["body"] = body_file.read()
+            # Marks the response as recently used
+            os.utime(body_path)
+        except CACHE_READ_ERRORS:
+            # Not cached, evicted or unreadable
+            return None
+        return entry
+
+    def _write(self, key, response, etag, last_modified):
+        """Stores a response, then evicts the least recently used responses when the cache is too large"""
+        meta_path, body_path = self._get_paths(key)
+        meta = {
+            "url": response.url,
+            "etag": etag,
+            "last_modified": last_modified,
+            "encoding": response.encoding,
+            "headers": dict(response.headers),
+        }
+        body = response.content
+        if len(body) > self.max_size:
+            return
+
+        try:
+            previous_size = _get_size(meta_path) + _get_size(body_path)
+            # Written to temporary files first, so other threads and tasks never read half a response
+            temporary_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(body_path + temporary_suffix, "wb") as body_file:
+                body_file.write(body)
+            with open(meta_path + temporary_suffix, "w") as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(body_path + temporary_suffix, body_path)
+            os.replace(meta_path + temporary_suffix, meta_path)
+        except OSError as e:
+            logging.warning(f"Could not write {response.url} to the http cache {self.cache_dir}: {e}")
+            return
+
+        with self._lock:
+            self._size += _get_size(meta_path) + _get_size(body_path) - previous_size
+            if self._size > self.max_size:
+                self._evict()
+
+    def _evict(self):
+        """Removes the least recently used responses until the cache is below 90% of max_size"""
+        entries = sorted(self._list_entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        evicted_count = 0
+        for key, size, _ in entries:
+            if self._size <= self.max_size * 0.9:
+                break
+            for path in self._get_paths(key):
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+            self._size -= size
+            evicted_count += 1
+        logging.debug(f"Evicted {evicted_count} responses from the http cache {self.cache_dir}")
+
+    def _list_entries(self):
+        """Returns (key, size, last used time) tuples of the cached responses"""
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if not file_name.endswith(".body"):
+                continue
+            key = file_name[: -len(".body")]
+            meta_path, body_path = self._get_paths(key)
+            try:
+                stat = os.stat(body_path)
+            except OSError:
+                continue
+            entries.append((key, stat.st_size + _get_size(meta_path), stat.st_mtime))
+        return entries
+
+
+def _get_key(url, params):
+    """Returns the cache key of a url and its params"""
+    params = sorted((str(name), str(value)) for name, value in (params or {}).items())
+    return hashlib.sha256(json.dumps([url, params]).encode()).hexdigest()
+
+
+def _get_size(path):
+    """Returns the size of a file, 0 when it doesn't exist"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _build_response(entry, not_modified_response):
+    """Returns a 200 response with the cached body and headers"""
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = "OK"
+    response._content = entry["body"]
+    response.encoding = entry["encoding"]
+    response.url = entry["url"]
+    response.headers = CaseInsensitiveDict(entry["headers"])
+    # The other headers of the 304 response, like the rate limit headers, are the current ones
+    for name, value in not_modified_response.headers.items():
+        if name.lower() not in _BODY_HEADERS:
+            response.headers[name] = value
+    response.request = not_modified_response.request
+    response.elapsed = not_modified_response.elapsed
+    return response
@@ -1,5 +1,6 @@
 import logging
 from datetime import datetime
+from itertools import chain
 
 from ...wherescape import WhereScape
 from .process_data import hubspot_process_results
@@ -26,12 +27,14 @@ def hubspot_load_data():
     environment = wherescape_instance.meta_db_connection_string.split(";")[0]
     develop_env = "dev" in environment.lower()
 
-    result = wherescape_instance.query_target(sql)
+    # Stream the rows, so batches are sent to HubSpot while the rest is still being read.
+    rows = wherescape_instance.iter_target(sql)
+    first_row = next(rows, None)
     access_token = hubspot_get_token(wherescape_instance, table_name, develop_env)
     column_names = wherescape_instance.get_columns()[0]
 
-    if len(result) > 0:
-        hubspot_process_results(access_token, result, column_names, table_name)
+    if first_row is not None:
+        hubspot_process_results(access_token, chain([first_row], rows), column_names, table_name)
         logging.info("hubspot update done")
 
 
@@ -53,6 +56,8 @@ def hubspot_get_token(wherescape_instance: WhereScape, table_name: str, develop_
     table_words = table_name.split("_")
 
     logging.info("retrieving access_token")
+    # Read all candidate parameters in one go instead of one round-trip per candidate.
+    wherescape_instance.prefetch_parameters(parameter_name)
 
     # return access token if it can be found with words in table
     for word in table_words:
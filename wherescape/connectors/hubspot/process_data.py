@@ -16,7 +16,7 @@ def hubspot_process_results(access_token: str, results: list, column_names: list
 
     Parameters:
     - access_token (string): token connecting to the private app allowing access to hubspot
-    - results (list): content that will be sent to hubspot
+    - results (iterable): rows with the content that will be sent to hubspot
     - column_names (list): names related to the data to know what data goes in which hubspot property
     - table_name (string): name of the table containing info about the desired process and destination
     """
@@ -78,8 +78,7 @@ def create_data_dict(result: list, column_names: list, known_names: list):
     result_dict = {}
     property_dict = {}
 
-    for name in column_names:
-        data_item = result[column_names.index(name)]
+    for name, data_item in zip(column_names, result, strict=False):
         if name in known_names:
             """
             For 1-to-1 column_names and property_names
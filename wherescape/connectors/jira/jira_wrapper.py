@@ -2,12 +2,14 @@
 
 import json
 import logging
+import time
 
 import pandas as pd
-import requests
 from requests.auth import HTTPBasicAuth
 
-from ...helper_functions import filter_dict, flatten_json
+from ...helper_functions import filter_dict, flatten_json, iterate_concurrently
+from ..rate_limit import RateLimiter
+from ..sessions import create_session
 
 
 """
@@ -66,16 +68,46 @@ KEYS_TO_KEEP_FROM_PROJECTS_JSON = {
 
 
 class Jira:
-    def __init__(self, user, apikey, base_url):
+    def __init__(self, user, apikey, base_url, rate_limiter=None, concurrency=4, max_results=100):
+        """
+        Initializes the Jira class. `concurrency` is the number of projects of
+        which the issues are fetched at the same time, `max_results` the number
+        of issues per page of the search. All requests go through the rate_limiter,
+        which by default follows the rate limit headers of JIRA.
+        """
         self.user = user
         self.apikey = apikey
         self.base_url = base_url
+        self.concurrency = max(1, concurrency)
+        self.max_results = max_results
 
         self.issue_jql = "project = {} ORDER BY key"
         self.issue_jql_since = 'project = {} AND (created >= "{}" OR updated >= "{}")'
+        self.issue_jql_since_projects = 'project in ({}) AND (created >= "{}" OR updated >= "{}") ORDER BY key'
         self.search_issues = "/search/jql"
         self.search_projects = "/project/search"
 
+        # All requests go through the rate limiter, which follows the rate limit headers of JIRA
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        # One connection per thread is kept open to the JIRA API
+        self.session = create_session(
+            pool_size=self.concurrency,
+            headers={"Accept": "application/json", "Content-Type": "application/json"},
+            auth=HTTPBasicAuth(self.user, self.apikey),
+        )
+
+    def close(self):
+        """
+        Closes the connections to the JIRA API.
+        """
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def issue_column_names_and_types(self):
         """
         Return value is the Dictionary for issues of what we keep from the
@@ -102,10 +134,7 @@ class Jira:
         Returns:
         response object: response of the request made
         """
-        headers = {"Accept": "application/json", "Content-Type": "application/json"}
-        auth = HTTPBasicAuth(self.user, self.apikey)
-
-        response = requests.request(method, url, data=payload, headers=headers, auth=auth)
+        response = self.rate_limiter.request(lambda: self.session.request(method, url, data=payload), url)
 
         if response.status_code != 200:
             raise Exception(f"JIRA connection error {response.status_code}: {response.content}")
@@ -160,15 +189,84 @@ class Jira:
         Returns:
         all_issues_per_project: list of lists with issue data
         """
-        projects = self.get_all_projects(as_numpy=False)
-
         all_issues_per_project = []
-        for project in projects:
-            if project["isPrivate"]:
-                continue
-            all_issues_per_project.extend(self.get_issue_data_per_project(project["id"], since))
+        for _, issues in self.iter_issues_per_project(since, ordered=True):
+            all_issues_per_project.extend(issues)
         return all_issues_per_project
 
+    def iter_issues_per_project(self, since=None, skip_projects=(), ordered=False):
+        """
+        Iter issues per project
+        The issues of `concurrency` projects are fetched at the same time, and
+        yielded as soon as a project has been fetched.
+
+        Parameters:
+        since (string): See get_all_issues
+        skip_projects (iterable): Ids of projects that are skipped, e.g. the
+            projects that were already loaded before a crash
+        ordered (bool): Yield the projects in the order of the project list
+            instead, see iterate_concurrently
+
+        Returns:
+        generator: (project id, list of lists with issue data) tuples per project
+        """
+        projects = self._get_projects_to_load(skip_projects)
+
+        def iter_project_issues(project):
+            # Runs in a worker thread
+            start_time = time.monotonic()
+            issues = self.get_issue_data_per_project(project["id"], since)
+            seconds = time.monotonic() - start_time
+            logging.info(f"Fetched {len(issues)} issues of project {project['id']} in {seconds:.2f} seconds")
+            yield project["id"], issues
+
+        logging.info(f"Fetching the issues of {len(projects)} projects, {self.concurrency} at a time")
+        return iterate_concurrently(projects, iter_project_issues, concurrency=self.concurrency, ordered=ordered)
+
+    def iter_issues_per_project_chunk(self, since, projects_per_query=50, skip_projects=()):
+        """
+        Iter issues per project chunk
+        Searches the issues created or updated since `since` with one JQL query
+        per chunk of projects (project in (...)), instead of one query per
+        project. When few issues changed this takes a few requests in total.
+        The chunks are searched `concurrency` at a time.
+
+        Parameters:
+        since (string): See get_all_issues
+        projects_per_query (int): Maximum number of projects in one query
+        skip_projects (iterable): Ids of projects that are skipped, e.g. the
+            projects that were already loaded before a crash
+
+        Returns:
+        generator: (list of project ids, list of lists with issue data) tuples per chunk
+        """
+        project_ids = [project["id"] for project in self._get_projects_to_load(skip_projects)]
+        chunks = [project_ids[i : i + projects_per_query] for i in range(0, len(project_ids), projects_per_query)]
+
+        def iter_chunk_issues(chunk):
+            # Runs in a worker thread
+            start_time = time.monotonic()
+            project_list = ", ".join(str(project_id) for project_id in chunk)
+            jql = self.issue_jql_since_projects.format(project_list, since, since)
+            issues = self._search_issues(jql)
+            seconds = time.monotonic() - start_time
+            logging.info(f"Fetched {len(issues)} issues of {len(chunk)} projects in {seconds:.2f} seconds")
+            yield chunk, issues
+
+        logging.info(f"Fetching the issues of {len(project_ids)} projects with {len(chunks)} queries")
+        return iterate_concurrently(chunks, iter_chunk_issues, concurrency=self.concurrency)
+
+    def _get_projects_to_load(self, skip_projects=()):
+        """
+        Returns the projects of which the issues are loaded: the projects that
+        aren't private or in skip_projects.
+        """
+        projects = self.get_all_projects(as_numpy=False)
+        skip_projects = {str(project_id) for project_id in skip_projects}
+        return [
+            project for project in projects if not project["isPrivate"] and str(project["id"]) not in skip_projects
+        ]
+
     def get_issue_data_per_project(self, project_id, since=None):
         """
         Get all issue data per project, expand on changelog of a ticket
@@ -181,14 +279,24 @@ class Jira:
         Returns:
         all_issues: list of issues for one project
         """
-        max_results = 50
-        nextPageToken = None
-        isLast = False
         if since:
             jql = self.issue_jql_since.format(project_id, since, since)
         else:
             jql = self.issue_jql.format(project_id)
+        return self._search_issues(jql)
+
+    def _search_issues(self, jql):
+        """
+        Pages through the issues found by a JQL query, expanded on the changelog.
+
+        Parameters:
+        jql (string): The JQL query
 
+        Returns:
+        all_issues: list of lists with issue data
+        """
+        nextPageToken = None
+        isLast = False
         all_issues = []
 
         while not isLast:
@@ -196,7 +304,7 @@ class Jira:
             payload = json.dumps(
                 {
                     "jql": jql,
-                    "maxResults": max_results,
+                    "maxResults": self.max_results,
                     "nextPageToken": nextPageToken,
                     "expand": "changelog",
                 }
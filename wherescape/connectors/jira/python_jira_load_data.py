@@ -1,13 +1,13 @@
 import logging
 import os
 from datetime import datetime
+from itertools import chain
 
-from ... import WhereScape
-from ...helper_functions import create_column_names
+from ... import LoadCheckpoint, LoadTableWriter, WhereScape
 from .jira_wrapper import Jira
 
 
-def jira_load_data_project(is_legacy=False):
+def jira_load_data_project(is_legacy=False, load_method=None):
     """
     Function to be called from the host script in WhereScape. Will import
     project data to the load table.
@@ -18,11 +18,15 @@ def jira_load_data_project(is_legacy=False):
             uses create_column_names() which only adds numbers when needed for
             uniqueness. Set to True for existing tables that were created with
             the legacy naming convention. Defaults to False.
+        load_method (str): How the rows are loaded into the load table, see
+            WhereScape.bulk_load_to_target. One of "executemany",
+            "fast_executemany", "values" or "copy", or "fastest" for the fastest
+            method available. Defaults to "executemany".
     """
-    jira_load_data("project", is_legacy=is_legacy)
+    jira_load_data("project", is_legacy=is_legacy, load_method=load_method)
 
 
-def jira_load_data_issue(is_legacy=False):
+def jira_load_data_issue(is_legacy=False, load_method=None, resumable=False, concurrency=4):
     """
     Function to be called from the host script in WhereScape. Will import
     all issue data to the load table.
@@ -33,11 +37,21 @@ def jira_load_data_issue(is_legacy=False):
             uses create_column_names() which only adds numbers when needed for
             uniqueness. Set to True for existing tables that were created with
             the legacy naming convention. Defaults to False.
+        load_method (str): How the rows are loaded into the load table, see
+            WhereScape.bulk_load_to_target. One of "executemany",
+            "fast_executemany", "values" or "copy", or "fastest" for the fastest
+            method available. Defaults to "executemany".
+        resumable (bool): Resume a load that crashed, see jira_load_data.
+            Defaults to False.
+        concurrency (int): Number of projects of which the issues are fetched
+            at the same time. Defaults to 4.
     """
-    jira_load_data("issue", is_legacy=is_legacy)
+    jira_load_data("issue", is_legacy=is_legacy, load_method=load_method, resumable=resumable, concurrency=concurrency)
 
 
-def jira_load_data_issue_incremental(is_legacy=False):
+def jira_load_data_issue_incremental(
+    is_legacy=False, load_method=None, resumable=False, concurrency=4, cross_project_query=False
+):
     """
     Function to be called from the host script in WhereScape. Will import
     issue data to the load table that has been added or modified in the last
@@ -49,11 +63,40 @@ def jira_load_data_issue_incremental(is_legacy=False):
             uses create_column_names() which only adds numbers when needed for
             uniqueness. Set to True for existing tables that were created with
             the legacy naming convention. Defaults to False.
+        load_method (str): How the rows are loaded into the load table, see
+            WhereScape.bulk_load_to_target. One of "executemany",
+            "fast_executemany", "values" or "copy", or "fastest" for the fastest
+            method available. Defaults to "executemany".
+        resumable (bool): Resume a load that crashed, see jira_load_data.
+            Defaults to False.
+        concurrency (int): Number of projects of which the issues are fetched
+            at the same time. Defaults to 4.
+        cross_project_query (bool): Search the changed issues of many projects
+            with one query, see jira_load_data. Defaults to False.
     """
-    jira_load_data("issue", use_high_water_mark=True, is_legacy=is_legacy)
-
-
-def jira_load_data(load_type, use_high_water_mark=False, since=None, is_legacy=False):
+    jira_load_data(
+        "issue",
+        use_high_water_mark=True,
+        is_legacy=is_legacy,
+        load_method=load_method,
+        resumable=resumable,
+        concurrency=concurrency,
+        cross_project_query=cross_project_query,
+    )
+
+
+def jira_load_data(
+    load_type,
+    use_high_water_mark=False,
+    since=None,
+    is_legacy=False,
+    load_method=None,
+    resumable=False,
+    concurrency=4,
+    max_results=100,
+    cross_project_query=False,
+    projects_per_query=50,
+):
     """
     Main jira load data function. Loads data from Jira and pushes it to
     the warehouse. This is the glue between the jira_wrapper and WhereScape.
@@ -69,6 +112,23 @@ def jira_load_data(load_type, use_high_water_mark=False, since=None, is_legacy=F
             uses create_column_names() which only adds numbers when needed for
             uniqueness. Set to True for existing tables that were created with
             the legacy naming convention. Defaults to False.
+        load_method (str): How the rows are loaded into the load table, see
+            WhereScape.bulk_load_to_target. One of "executemany",
+            "fast_executemany", "values" or "copy", or "fastest" for the fastest
+            method available. Defaults to "executemany".
+        resumable (bool): For issues: write every project in its own transaction
+            and keep the written projects in a checkpoint in the workdir (see
+            LoadCheckpoint), so a load that crashed continues with the projects
+            that weren't written yet when it's run again. Defaults to False.
+        concurrency (int): Number of projects of which the issues are fetched
+            at the same time. Defaults to 4.
+        max_results (int): Number of issues per page. Defaults to 100.
+        cross_project_query (bool): For incremental issue loads (with since):
+            search the issues of projects_per_query projects with one JQL query
+            (project in (...)) instead of one query per project, so a load with
+            few changed issues takes a few requests. Defaults to False.
+        projects_per_query (int): Maximum number of projects in one query of
+            cross_project_query. Defaults to 50.
     """
     start_time = datetime.now()
     # First initialise WhereScape to setup logging
@@ -91,56 +151,67 @@ def jira_load_data(load_type, use_high_water_mark=False, since=None, is_legacy=F
     apikey = os.getenv("WSL_SRCCFG_APIKEY")
     table_name = wherescape_instance.load_full_name
 
+    # The dss_load_date and the next high water mark of a resumed load are those of the run that started it
+    load_date = start_time
+    checkpoint = None
+    if resumable and load_type == "issue":
+        checkpoint = LoadCheckpoint(wherescape_instance, f"jira_{load_type}", start_time, table_name)
+        load_date = checkpoint.load_date
+
     # Request data from Jira.
     logging.info("Requesting data from Jira")
-    jira_instance = Jira(user, apikey, base_url)
-    if load_type == "project":
-        columns = jira_instance.project_column_names_and_types()
-        values = jira_instance.get_all_projects()
-    elif load_type == "issue":
-        columns = jira_instance.issue_column_names_and_types()
-        values = jira_instance.get_all_issues(since)
-    else:
-        raise Exception("Wrong jira load type supplied")
-
-    if values:
-        # Prepare columns names for query.
-        if not is_legacy:
-            columns = create_column_names(columns)
+    with Jira(user, apikey, base_url, concurrency=concurrency, max_results=max_results) as jira_instance:
+        if load_type == "project":
+            columns = jira_instance.project_column_names_and_types()
+        elif load_type == "issue":
+            columns = jira_instance.issue_column_names_and_types()
         else:
-            from ...helper_functions import create_legacy_column_names
-
-            columns = create_legacy_column_names(columns)
-        columns.append("dss_record_source")
-        columns.append("dss_load_date")
-
-        # Append dss column data to all rows.
-        rows = []
-        for row in values:
-            row.append("Jira api - " + load_type)
-            row.append(start_time)
-            rows.append(row)
-
-        # Prepare the sql
-        logging.info("Preparing insert query")
-        column_names_string = ",".join(column for column in columns)
-        question_mark_string = ",".join("?" for _ in columns)
-        sql = f"INSERT INTO {table_name} ({column_names_string}) VALUES ({question_mark_string})"
-
-        # Execute the sql
-        wherescape_instance.push_many_to_target(sql, rows)
-        logging.info(f"Successfully inserted {len(rows)} rows in to the load table.")
+            raise Exception("Wrong jira load type supplied")
+
+        writer = LoadTableWriter(
+            wherescape_instance,
+            "Jira api - " + load_type,
+            fields=columns,
+            table_name=table_name,
+            load_date=load_date,
+            load_method=load_method,
+            is_legacy=is_legacy,
+        )
+
+        if load_type == "project":
+            row_count = writer.write(jira_instance.get_all_projects())
+        else:
+            skip_projects = checkpoint.completed if checkpoint is not None else ()
+            if cross_project_query and since:
+                issues_per_part = jira_instance.iter_issues_per_project_chunk(since, projects_per_query, skip_projects)
+            else:
+                issues_per_project = jira_instance.iter_issues_per_project(since, skip_projects)
+                issues_per_part = (([project_id], issues) for project_id, issues in issues_per_project)
+
+            if checkpoint is None:
+                row_count = writer.write(chain.from_iterable(issues for _, issues in issues_per_part))
+            else:
+                # Every part is written in its own transaction and then committed to the checkpoint
+                for project_ids, issues in issues_per_part:
+                    checkpoint.commit(writer.write(issues, atomic=True), project_ids)
+                row_count = checkpoint.row_count
+
+    if row_count > 0:
+        logging.info(f"Successfully inserted {row_count} rows in to the load table.")
 
         # Update the high_water_mark. Will also be updated if use_high_water_mark=False
-        wherescape_instance.write_parameter("jira_high_water_mark", start_time.strftime("%Y-%m-%d %H:%M"))
-        logging.info(f"New high water mark is: {start_time.strftime('%Y-%m-%d %H:%M')}")
+        wherescape_instance.write_parameter("jira_high_water_mark", load_date.strftime("%Y-%m-%d %H:%M"))
+        logging.info(f"New high water mark is: {load_date.strftime('%Y-%m-%d %H:%M')}")
 
         # Add success message
-        wherescape_instance.main_message = f"Successfully inserted {len(rows)} rows in to the load table."
+        wherescape_instance.main_message = f"Successfully inserted {row_count} rows in to the load table."
 
     else:
         logging.info("No object changes received from JIRA")
 
+    if checkpoint is not None:
+        checkpoint.finish()
+
     # Final logging
     end_time = datetime.now()
     logging.info(f"Time elapsed: {(end_time - start_time).seconds} seconds for jira_load_data")
@@ -0,0 +1,199 @@
+"""
+Module with the rate limiter that is shared by the threads of a REST connector.
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+import requests
+
+
+# Status codes that are retried: rate limited and temporary server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """
+    Token bucket that spaces out the requests of all threads of a connector.
+
+    The rate follows the rate limit headers of the server (RateLimit-Remaining
+    and RateLimit-Reset, or their X- prefixed versions): the remaining requests
+    are spread out over the time until the limit resets, keeping `reserve`
+    requests for other users of the same account. When the server answers with
+    429 (too many requests) or a temporary server error, all threads wait for
+    Retry-After or an exponential backoff, and the request is retried.
+
+    Example:
+    rate_limiter = RateLimiter(requests_per_second=10)
+    response = rate_limiter.request(lambda: session.get(url), url)
+    """
+
+    def __init__(self, requests_per_second=None, burst=5, reserve=10, max_retries=5, backoff=1):
+        """
+        Initialises the rate limiter.
+
+        Parameters:
+        requests_per_second (float): Maximum number of requests per second. None
+            means the rate is only limited by the rate limit headers of the server.
+        burst (int): Number of requests that may be sent at once
+        reserve (int): Number of requests of the server's limit that are left unused
+        max_retries (int): Number of times a rate limited or failed request is retried
+        backoff (float): Seconds to wait before the first retry when the server
+            doesn't send Retry-After. Doubles with every retry.
+        """
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.reserve = reserve
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.rate = requests_per_second
+        self._tokens = burst
+        self._last_update = time.monotonic()
+        self._paused_until = 0
+        self._lock = threading.Lock()
+
+        # Number of times the server answered with 429
+        self.rate_limited_count = 0
+
+    def acquire(self):
+        """
+        Waits until a request may be sent.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = self._paused_until - now
+            if self.rate:
+                self._tokens = min(self.burst, self._tokens + (now - self._last_update) * self.rate)
+                self._tokens -= 1
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens / self.rate)
+            self._last_update = now
+
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Holds back the requests of all threads for a number of seconds.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def update(self, response):
+        """
+        Adjusts the rate to the rate limit headers of a response.
+        """
+        remaining = _get_header(response, "RateLimit-Remaining")
+        reset = _get_header(response, "RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+
+        try:
+            remaining = int(remaining)
+            seconds_until_reset = max(_parse_reset(reset), 1)
+        except ValueError:
+            return
+
+        available = remaining - self.reserve
+        if available <= 0:
+            logging.info(f"Rate limit almost reached, waiting {seconds_until_reset:.0f} seconds for the reset")
+            self.pause(seconds_until_reset)
+            return
+
+        header_rate = available / seconds_until_reset
+        with self._lock:
+            if self.requests_per_second:
+                self.rate = min(self.requests_per_second, header_rate)
+            else:
+                self.rate = header_rate
+
+    def request(self, send_request, description="", retry_timeouts=True):
+        """
+        Sends a request when allowed and retries it when it's rate limited or
+        fails temporarily.
+
+        Parameters:
+        send_request (function): Function without arguments that sends the request
+        description (string): Description of the request for the log (e.g. the url)
+        retry_timeouts (boolean): Retry requests that time out. When False the
+            Timeout is raised, e.g. so the caller can request a smaller page.
+
+        Returns:
+        response object: the response of the last attempt
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            try:
+                response = send_request()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries or (not retry_timeouts and isinstance(e, requests.exceptions.Timeout)):
+                    raise
+                wait_time = self.backoff * 2**attempt
+                logging.info(f"Request error for {description}: {e}, retrying in {wait_time}s...")
+                time.sleep(wait_time)
+                continue
+
+            self.update(response)
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                return response
+
+            retry_after = _get_header(response, "Retry-After")
+            wait_time = _parse_retry_after(retry_after) if retry_after else self.backoff * 2**attempt
+            if response.status_code == 429:
+                with self._lock:
+                    self.rate_limited_count += 1
+                # All threads wait, they share the same limit
+                self.pause(wait_time)
+            logging.info(
+                f"{response.status_code} response on attempt {attempt + 1}/{self.max_retries + 1} "
+                f"for {description}, retrying in {wait_time:.0f}s..."
+            )
+            time.sleep(wait_time)
+
+        return response
+
+
+def _get_header(response, name):
+    """
+    Returns a rate limit header, with or without X- prefix.
+    """
+    value = response.headers.get(name)
+    if value is None:
+        value = response.headers.get(f"X-{name}")
+    return value
+
+
+def _parse_reset(value):
+    """
+    Returns the number of seconds until a rate limit reset. The reset is
+    either a unix timestamp, a number of seconds or an ISO formatted datetime.
+    """
+    try:
+        reset = float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp() - time.time()
+
+    if reset > 1_000_000_000:
+        # unix timestamp
+        return reset - time.time()
+    return reset
+
+
+def _parse_retry_after(value):
+    """
+    Returns the number of seconds of a Retry-After header, which is either a
+    number of seconds or a HTTP date.
+    """
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except ValueError:
+        return 1
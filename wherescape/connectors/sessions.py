@@ -0,0 +1,32 @@
+"""
+Module with helpers for the HTTP sessions of the REST connectors.
+"""
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def create_session(pool_size=10, headers=None, auth=None):
+    """
+    Creates a requests Session that keeps its connections open, so paging
+    through an API doesn't set up a new TCP and TLS connection per request.
+
+    Parameters:
+    pool_size (int): Number of connections kept open per host. Should be at
+        least the number of threads that use the session at the same time.
+    headers (dict): Headers sent with every request
+    auth (requests.auth.AuthBase): Authentication used for every request
+
+    Returns:
+    requests.Session: the session. Close it when done.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    if headers:
+        session.headers.update(headers)
+    if auth is not None:
+        session.auth = auth
+    return session
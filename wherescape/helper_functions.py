@@ -1,3 +1,8 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
 from dateutil.parser import parse
 from slugify import slugify
 
@@ -273,6 +278,125 @@ def fill_out_empty_keys(cleaned_json, keys_to_keep, overwrite):
     return out
 
 
+def chunk_iterable(iterable, chunk_size=None):
+    """
+    Splits any iterable (e.g. a list or a generator) into lists of at most
+    chunk_size items, without materialising more than one chunk at a time.
+    When chunk_size is None all items are returned as a single chunk. Empty
+    chunks are never returned.
+
+    Parameters:
+    iterable (iterable): The items to split up
+    chunk_size (int): The maximum number of items per chunk
+
+    Returns:
+    generator: Lists with the items of each chunk
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size)) if chunk_size else list(iterator)
+        if not chunk:
+            return
+        yield chunk
+        if not chunk_size:
+            return
+
+
+def iterate_concurrently(items, create_iterator, concurrency=4, buffer_size=4, on_error=None, ordered=False):
+    """
+    Iterates over the iterators of several items at the same time, each in a
+    background thread, and yields their values in the order they are produced.
+    The values of different items are interleaved, so one large item (e.g. a
+    project with many pages) doesn't hold up the others. At most `concurrency`
+    iterators run at the same time and together they run at most
+    concurrency * buffer_size values ahead, so memory stays bounded while the
+    caller works on the values (e.g. writes them to the database).
+
+    Parameters:
+    items (iterable): The items to create the iterators for (e.g. projects)
+    create_iterator (function): Function that gets an item and returns an iterable
+    concurrency (int): The maximum number of iterators that run at the same time
+    buffer_size (int): The number of values per iterator that can run ahead
+    on_error (function): Function that gets the item and the exception when an
+        iterator fails. The other items are still iterated. When None, the
+        exception is raised.
+    ordered (bool): Yield the values in the order of the items instead. The
+        iterators still run at the same time, but the values of an item are
+        held back until the items before it are done, so only use it when the
+        values are collected anyway (e.g. into a list).
+
+    Returns:
+    generator: The values of all iterators
+    """
+    done = object()
+    stop = threading.Event()
+    buffer = queue.Queue(maxsize=concurrency * buffer_size)
+
+    def put(value):
+        # Gives up when the caller stopped iterating, so the thread can finish
+        while not stop.is_set():
+            try:
+                buffer.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce(index, item):
+        try:
+            for value in create_iterator(item):
+                if not put((index, item, value, None)):
+                    return
+        except Exception as e:
+            put((index, item, done, e))
+        else:
+            put((index, item, done, None))
+
+    item_iterator = enumerate(items)
+    running_count = 0
+    # When ordered, the values of the items after the first unfinished item are held back
+    next_index = 0
+    held_values = {}
+    finished_indexes = set()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+
+        def submit_next():
+            nonlocal running_count
+            index_and_item = next(item_iterator, done)
+            if index_and_item is not done:
+                executor.submit(produce, *index_and_item)
+                running_count += 1
+
+        try:
+            for _ in range(concurrency):
+                submit_next()
+
+            while running_count:
+                index, item, value, error = buffer.get()
+                if value is not done:
+                    if ordered and index != next_index:
+                        held_values.setdefault(index, []).append(value)
+                    else:
+                        yield value
+                    continue
+
+                running_count -= 1
+                submit_next()
+                if error is not None:
+                    if on_error is None:
+                        raise error
+                    on_error(item, error)
+
+                if ordered:
+                    finished_indexes.add(index)
+                    while next_index in finished_indexes:
+                        finished_indexes.remove(next_index)
+                        next_index += 1
+                        yield from held_values.pop(next_index, ())
+        finally:
+            stop.set()
+
+
 def is_date(string, fuzzy=False):
     """
     Return whether the string can be interpreted as a date.
@@ -0,0 +1,121 @@
+"""
+Module with the LoadCheckpoint, which keeps track of the progress of a load,
+so a load that crashed can be resumed.
+"""
+
+import contextlib
+import json
+import logging
+import os
+from datetime import datetime
+
+
+class LoadCheckpoint:
+    """
+    Keeps the parts (e.g. projects) of a load that have been written to the
+    load table in a state file in the workdir. When the load crashes, the next
+    run skips the parts that were already written, and continues with the same
+    load date. The state file is removed when the load finishes.
+
+    A part has to be written in one transaction (see LoadTableWriter.write with
+    atomic=True) before it's completed, so the load table never holds half a part.
+    The checkpoint is only resumed when the load table still holds exactly the
+    rows that were written, e.g. not when it has been truncated since.
+
+    Example:
+    checkpoint = LoadCheckpoint(wherescape_instance, "gitlab_issues", datetime.now())
+    writer = LoadTableWriter(wherescape_instance, "gitlab api", fields=columns, load_date=checkpoint.load_date)
+    for project_id, rows in rows_per_project:
+        if str(project_id) not in checkpoint.completed:
+            checkpoint.commit(writer.write(rows, atomic=True), [project_id])
+    checkpoint.finish()
+    """
+
+    def __init__(self, wherescape_instance, name, load_date, table_name=None):
+        """
+        Initialises the checkpoint and resumes the state of a previous run.
+
+        Args:
+            wherescape_instance (WhereScape): WhereScape instance for database operations
+            name (str): Name of the load, e.g. 'gitlab_issues'. Used for the name of the state file.
+            load_date (datetime): dss_load_date of the load. A resumed load keeps the
+                load date of the run that started it.
+            table_name (str): 'schema.table' of the load table. Defaults to the load
+                table of the WhereScape instance.
+        """
+        self.wherescape_instance = wherescape_instance
+        self.table_name = table_name if table_name is not None else wherescape_instance.load_full_name
+        self.path = os.path.join(wherescape_instance.workdir, f"{name}_checkpoint.json")
+
+        # Keys of the completed parts, as strings
+        self.completed = set()
+        # Number of rows written by all runs of the load
+        self.row_count = 0
+        self.load_date = load_date
+
+        self._resume()
+
+    def _resume(self):
+        """
+        Reads the state of a previous run, when it matches the load table.
+        """
+        try:
+            with open(self.path) as state_file:
+                state = json.load(state_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not read the checkpoint {self.path}, starting over: {e}")
+            return
+
+        if state.get("table_name") != self.table_name:
+            logging.warning(f"The checkpoint {self.path} is of another load table, starting over")
+            return
+
+        table_row_count = self.wherescape_instance.query_target(f"SELECT COUNT(*) FROM {self.table_name}")[0][0]
+        if table_row_count != state["row_count"]:
+            logging.warning(
+                f"{self.table_name} has {table_row_count} rows instead of the {state['row_count']} rows "
+                f"of the checkpoint {self.path}, starting over"
+            )
+            return
+
+        self.completed = set(state["completed"])
+        self.row_count = state["row_count"]
+        self.load_date = datetime.fromisoformat(state["load_date"])
+        logging.info(
+            f"Resuming the load from the checkpoint {self.path}: {len(self.completed)} parts with "
+            f"{self.row_count} rows were already written"
+        )
+
+    def commit(self, row_count, keys=()):
+        """
+        Adds rows that have been written to the load table and marks their parts
+        as completed, then saves the state. Without keys the rows are counted, but
+        no part is completed (e.g. when a part was fetched partially).
+
+        Args:
+            row_count (int): Number of rows written to the load table
+            keys (iterable): Keys of the parts, e.g. project ids
+        """
+        self.completed.update(str(key) for key in keys)
+        self.row_count += row_count
+
+        state = {
+            "table_name": self.table_name,
+            "load_date": self.load_date.isoformat(),
+            "completed": sorted(self.completed),
+            "row_count": self.row_count,
+        }
+        # Written to a temporary file first, so a crash never leaves half a state file
+        temporary_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(temporary_path, self.path)
+
+    def finish(self):
+        """
+        Removes the state file, the next run starts a new load.
+        """
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
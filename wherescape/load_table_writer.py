@@ -0,0 +1,139 @@
+"""
+Module with the LoadTableWriter, which takes care of writing records from a
+connector to a load table.
+"""
+
+import logging
+from datetime import datetime
+from itertools import chain
+
+from .helper_functions import chunk_iterable, create_column_names, create_legacy_column_names
+from .wherescape import fastest_load_method
+
+
+class LoadTableWriter:
+    """
+    Writes records to a load table in fixed-size batches. The dss_record_source
+    and dss_load_date columns are added to each record while it's written, so
+    records can be streamed in from any iterable (e.g. a generator) and only
+    one batch is held in memory at a time.
+
+    Example:
+    writer = LoadTableWriter(wherescape_instance, "gitlab api - issues", fields=columns)
+    row_count = writer.write(records)
+    """
+
+    def __init__(
+        self,
+        wherescape_instance,
+        record_source,
+        fields=None,
+        table_name=None,
+        load_date=None,
+        load_method=None,
+        batch_size=10000,
+        is_legacy=False,
+    ):
+        """
+        Initialises the writer.
+
+        Args:
+            wherescape_instance (WhereScape): WhereScape instance for database operations
+            record_source (str): Value of the dss_record_source column
+            fields (list): Names of the fields of the records, in the order of the
+                record values. Turned into column names with create_column_names().
+                When None, the keys of the first (dict) record are used.
+            table_name (str): 'schema.table' to write to. Defaults to the load table
+                of the WhereScape instance.
+            load_date (datetime): Value of the dss_load_date column. Defaults to now.
+            load_method (str): Load method of WhereScape.bulk_load_to_target, e.g.
+                "fast_executemany". Defaults to "executemany". Use "fastest" for the
+                fastest method available (see fastest_load_method).
+            batch_size (int): Number of records written per batch.
+            is_legacy (bool): If True, uses create_legacy_column_names() for the
+                column names. Set to True for existing tables that were created with
+                the legacy naming convention. Defaults to False.
+        """
+        self.wherescape_instance = wherescape_instance
+        self.record_source = record_source
+        self.fields = list(fields) if fields is not None else None
+        self.table_name = table_name if table_name is not None else wherescape_instance.load_full_name
+        self.load_date = load_date if load_date is not None else datetime.now()
+        if load_method is None:
+            load_method = "executemany"
+        elif load_method == "fastest":
+            load_method = fastest_load_method(wherescape_instance.backend)
+        self.load_method = load_method
+        self.batch_size = batch_size
+        self.is_legacy = is_legacy
+
+        # Total number of rows written by this writer
+        self.row_count = 0
+
+    def get_column_names(self):
+        """
+        Returns the column names of the load table, including the dss columns.
+        """
+        if self.is_legacy:
+            columns = create_legacy_column_names(self.fields)
+        else:
+            columns = create_column_names(self.fields)
+        columns.append("dss_record_source")
+        columns.append("dss_load_date")
+        return columns
+
+    def write(self, records, atomic=True):
+        """
+        Writes records to the load table. Records are either lists (or tuples)
+        with the values in the order of the fields, or dicts with the fields as
+        keys. Can be called multiple times.
+
+        All records of this call are written in batches of batch_size in one
+        transaction, so either all or none of them are in the load table (e.g.
+        for a LoadCheckpoint). With atomic False every batch is committed on
+        its own.
+
+        Returns:
+        int: Number of rows written by this call
+        """
+        records = iter(records)
+        first_record = next(records, None)
+        if first_record is None:
+            return 0
+
+        if self.fields is None:
+            if not isinstance(first_record, dict):
+                raise ValueError("Fields are required when the records are not dicts")
+            self.fields = list(first_record.keys())
+
+        columns = self.get_column_names()
+        rows = map(self._create_row, chain([first_record], records))
+
+        # With atomic, bulk_load_to_target streams all rows in chunks of batch_size in one transaction
+        batches = [rows] if atomic else chunk_iterable(rows, self.batch_size)
+
+        row_count = 0
+        for batch in batches:
+            row_count += self.wherescape_instance.bulk_load_to_target(
+                self.table_name,
+                columns,
+                batch,
+                load_method=self.load_method,
+                chunk_size=self.batch_size,
+            )
+
+        self.row_count += row_count
+        logging.info(f"{row_count} rows written to {self.table_name}")
+        return row_count
+
+    def _create_row(self, record):
+        """
+        Turns a record into a row with the dss columns appended.
+        """
+        if isinstance(record, dict):
+            row = [record.get(field) for field in self.fields]
+        else:
+            row = list(record)
+        row.append(self.record_source)
+        row.append(self.load_date)
+        return row
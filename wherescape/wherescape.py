@@ -1,9 +1,39 @@
+import contextlib
+import functools
+import io
+import json
 import logging
 import os
+import re
+import time
+import weakref
+from datetime import date, datetime
+from decimal import Decimal
+
+from .backends import create_backend
+from .helper_functions import chunk_iterable
+from .logging import initialise_wherescape_logging
 
-import pyodbc
 
-from .logging import initialise_wherescape_logging
+try:
+    # psycopg is optional, it's only needed for the COPY load method.
+    import psycopg
+except ImportError:
+    psycopg = None
+
+# Methods available to bulk_load_to_target
+LOAD_METHODS = ("executemany", "fast_executemany", "values", "copy")
+
+
+def fastest_load_method(backend=None):
+    """
+    Returns the fastest load method available for bulk_load_to_target: COPY
+    when psycopg is installed (and the backend supports it), multi-row VALUES
+    otherwise.
+    """
+    if psycopg is None or (backend is not None and not backend.supports_copy):
+        return "values"
+    return "copy"
 
 
 class WhereScape:
@@ -18,6 +48,20 @@ class WhereScape:
     #   This is the message that appears in the job_log
     main_message = ""
 
+    # Number of seconds a pooled connection may be idle before it is checked
+    #   with a ping before being reused.
+    connection_ping_interval = 60
+
+    # Maximum number of ? placeholders in one statement for the multi-row
+    #   VALUES load method.
+    max_statement_parameters = 30000
+
+    # Set to True to log the statement summary (see get_statement_summary)
+    #   or write it to a JSON file in the workdir when the script exits. The
+    #   bytes of the statements are only estimated when one of them is set.
+    log_statement_stats = False
+    write_statement_stats = False
+
     def __init__(self):
         """
         Wherescape class instance initialisation function. Sets and checks validity
@@ -31,11 +75,16 @@ class WhereScape:
         schema, table               - schemaname, tablename from the WhereScape Context
         load_full_name              - 'schema.table' from the WhereScape Context
         column_names, column_types  - column_names, column_types of a load or stage table
-        object_key                  - object_key of a load or stage table
+        object_key                  - object_key of a load or stage table (looked up on first access)
         file_path, file_name        - Taken from the lt_file_path, lt_file_name of the Wherescape object context
+                                      (looked up on first access)
         source_base_url             - base url of the source connection configuration
         source_user                 - user name for the source connection configuration
         source_apikey               - api key for the source connection configuration
+        backend                     - database backend, set with the WSL_BACKEND environment variable
+
+        No database connections are opened here; connections and the metadata
+        of the load or stage table are only set up when they are first needed.
         """  # noqa: E501
         self.workdir = os.getenv("WSL_WORKDIR")
         if self.workdir is None:
@@ -58,6 +107,26 @@ class WhereScape:
         wsl_src_pwd = os.getenv("WSL_SRC_PWD")
         self.source_db_connection_string = f"DSN={wsl_src_dns};UID={wsl_src_user};PWD={wsl_src_pwd};sslmode=prefer"
 
+        # ODBC on a WhereScape server, or SQLite to run without one (see backends.py)
+        self.backend = create_backend()
+
+        # Open connections per database (meta, target, source), see get_connection()
+        self._connections = {}
+        self._connections_last_used = {}
+        # The psycopg connection of COPY loads per database, see _get_copy_connection()
+        self._copy_connections = {}
+        self._pending_connect_times = {}
+        # Only holds a weak reference, so instances that are no longer used can be
+        #   garbage collected with their connections.
+        weakref.finalize(self, _finalize_instance, weakref.ref(self), self._connections, self._copy_connections)
+
+        # Timings and row counts per database and SQL fingerprint, see get_statement_summary()
+        self.statement_stats = {}
+
+        # Cache of parameters read or written, see read_parameter()
+        self._parameters = {}
+        self._prefetched_parameter_prefixes = []
+
         self.sequence = os.getenv("WSL_SEQUENCE")
         self.job_key = os.getenv("WSL_JOB_KEY", "no-job-key")
         self.job_name = os.getenv("WSL_JOB_NAME", "no-job-name")
@@ -82,37 +151,327 @@ class WhereScape:
         self.schema = os.getenv("WSL_LOAD_SCHEMA")
         if self.schema == "load":
             # This script is related to a load table.
-            sql = "SELECT lt_obj_key, lt_file_path, lt_file_name FROM ws_load_tab WHERE lt_table_name = ?"
-            results = self.query_meta(sql, [self.table])
-            self.object_key = results[0][0]
-            self.file_path = results[0][1]
-            self.file_name = results[0][2]
             self.load_full_name = os.getenv("WSL_LOAD_FULLNAME")
-        elif self.schema == "stage":
-            # This script is related to a stage table.
-            sql = "SELECT st_obj_key FROM ws_stage_tab WHERE st_table_name = ?"
-            results = self.query_meta(sql, [self.table])
-            self.object_key = results[0][0]
+
+        # object_key, file_path and file_name are looked up on first access
+        self._object_metadata = None
+
+    @property
+    def object_key(self):
+        """
+        object_key of the load or stage table. Looked up on first access.
+        """
+        return self._get_object_metadata_value("object_key")
+
+    @property
+    def file_path(self):
+        """
+        lt_file_path of the load table. Looked up on first access.
+        """
+        return self._get_object_metadata_value("file_path")
+
+    @property
+    def file_name(self):
+        """
+        lt_file_name of the load table. Looked up on first access.
+        """
+        return self._get_object_metadata_value("file_name")
+
+    def _get_object_metadata_value(self, name):
+        """
+        Returns a value from the metadata of the load or stage table. All
+        values are read with one query the first time one of them is needed.
+        """
+        if self._object_metadata is None:
+            # Only cached when the query succeeds, so a failed lookup is retried
+            object_metadata = {}
+            if self.schema == "load":
+                # This script is related to a load table.
+                sql = "SELECT lt_obj_key, lt_file_path, lt_file_name FROM ws_load_tab WHERE lt_table_name = ?"
+                results = self.query_meta(sql, [self.table])
+                if not results:
+                    raise LookupError(f"Load table {self.table} not found in ws_load_tab")
+                object_metadata["object_key"] = results[0][0]
+                object_metadata["file_path"] = results[0][1]
+                object_metadata["file_name"] = results[0][2]
+            elif self.schema == "stage":
+                # This script is related to a stage table.
+                sql = "SELECT st_obj_key FROM ws_stage_tab WHERE st_table_name = ?"
+                results = self.query_meta(sql, [self.table])
+                if not results:
+                    raise LookupError(f"Stage table {self.table} not found in ws_stage_tab")
+                object_metadata["object_key"] = results[0][0]
+            self._object_metadata = object_metadata
+
+        if name not in self._object_metadata:
+            raise AttributeError(f"{name} is not available for schema '{self.schema}'")
+        return self._object_metadata[name]
 
     def get_columns(self):
         """
         Function to get the column names and types of the connected table.
+        The columns are looked up by table name, so the object_key isn't needed.
         """
         if self.schema == "load":
-            sql = "SELECT lc_col_name, lc_data_type FROM ws_load_col WHERE lc_obj_key = ? ORDER BY lc_order"
+            sql = """
+            SELECT lc_col_name, lc_data_type
+            FROM ws_load_col
+            INNER JOIN ws_load_tab ON lt_obj_key = lc_obj_key
+            WHERE lt_table_name = ?
+            ORDER BY lc_order"""
         elif self.schema == "stage":
-            sql = "SELECT sc_col_name, sc_data_type FROM ws_stage_col WHERE sc_obj_key = ? ORDER BY sc_order"
+            sql = """
+            SELECT sc_col_name, sc_data_type
+            FROM ws_stage_col
+            INNER JOIN ws_stage_tab ON st_obj_key = sc_obj_key
+            WHERE st_table_name = ?
+            ORDER BY sc_order"""
         else:
             logging.warning(f"Invalid schema: {self.schema}")
             return None
 
-        results = self.query_meta(sql, [self.object_key])
+        results = self.query_meta(sql, [self.table])
         column_names, column_types = [], []
         if results:
             column_names = [result[0] for result in results]
             column_types = [result[1] for result in results]
         return (column_names, column_types)
 
+    def get_connection(self, database):
+        """
+        Returns an open connection to the 'meta', 'target' or 'source' database.
+
+        Connections are kept open for the lifetime of the WhereScape instance,
+        so the login handshake is paid once per database instead of once per
+        statement. A connection that has been idle for longer than
+        connection_ping_interval seconds is checked first and replaced when it
+        turns out to be dead.
+        """
+        start_time = time.perf_counter()
+        conn = self._connections.get(database)
+        if conn is not None and not self._connection_is_alive(database, conn):
+            logging.info(f"Connection to the {database} database was lost, reconnecting")
+            self._close_connection(database)
+            conn = None
+
+        if conn is None:
+            conn = self.backend.connect(database, self._get_connection_string(database))
+            self._connections[database] = conn
+
+        self._connections_last_used[database] = time.monotonic()
+        self._add_connect_time(database, time.perf_counter() - start_time)
+        return conn
+
+    def close_connections(self):
+        """
+        Closes all open database connections. Is called automatically when the
+        script exits (pooled connections are also closed when the instance is
+        garbage collected), but can be called earlier to free the connections.
+        """
+        for database in list(self._connections):
+            self._close_connection(database)
+
+        for conn in self._copy_connections.values():
+            conn.close()
+        self._copy_connections.clear()
+
+    def _get_connection_string(self, database):
+        """
+        Returns the connection string belonging to a database name.
+        """
+        connection_strings = {
+            "meta": self.meta_db_connection_string,
+            "target": self.target_db_connection_string,
+            "source": self.source_db_connection_string,
+        }
+        if database not in connection_strings:
+            raise ValueError(f"Invalid database: {database}")
+        return connection_strings[database]
+
+    def _connection_is_alive(self, database, conn):
+        """
+        Checks whether a pooled connection can still be used. Only connections
+        that have been idle for a while are pinged.
+        """
+        if conn.closed:
+            return False
+
+        idle_time = time.monotonic() - self._connections_last_used.get(database, 0)
+        if idle_time < self.connection_ping_interval:
+            return True
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+        except self.backend.errors:
+            return False
+        return True
+
+    def _close_connection(self, database):
+        """
+        Closes the connection to a database and removes it from the pool.
+        """
+        conn = self._connections.pop(database, None)
+        self._connections_last_used.pop(database, None)
+        if conn is None:
+            return
+
+        try:
+            conn.close()
+        except self.backend.errors as e:
+            logging.warning(f"Could not close the connection to the {database} database: {e}")
+
+    def _handle_connection_error(self, database, error):
+        """
+        Removes a connection from the pool when an error indicates the
+        connection itself is broken, so the next statement reconnects.
+        """
+        if self.backend.is_disconnect(error):
+            self._close_connection(database)
+
+    def _rollback(self, conn):
+        """
+        Rolls back the open transaction after a failed statement, so the pooled
+        connection can be used for the next statement. Errors are ignored, the
+        connection may be broken. Does nothing when there's no connection (yet).
+        """
+        if conn is None:
+            return
+        with contextlib.suppress(*self.backend.errors):
+            conn.rollback()
+
+    def _on_exit(self):
+        """
+        Reports the statement statistics when requested and closes all
+        connections. Runs when the script exits.
+        """
+        if self.statement_stats and self.log_statement_stats:
+            self.log_statement_summary()
+        if self.statement_stats and self.write_statement_stats:
+            self.write_statement_summary()
+        self.close_connections()
+
+    def _get_database_name(self, conn):
+        """
+        Returns the name of the database a pooled connection belongs to.
+        """
+        for database, pooled_conn in self._connections.items():
+            if pooled_conn is conn:
+                return database
+        return "unknown"
+
+    def _iterate_on_own_connection(self, database, sql, params, batch_size, batches):
+        """
+        Runs iterate on a new connection to the database, which is closed when
+        the generator is exhausted or closed. Statements on the pooled
+        connection can run while the rows are being fetched.
+        """
+        start_time = time.perf_counter()
+        conn = self.backend.connect(database, self._get_connection_string(database))
+        self._add_connect_time(database, time.perf_counter() - start_time)
+        try:
+            yield from self.iterate(conn, sql, params, batch_size, batches, database=database)
+        finally:
+            # The in-memory SQLite backend has one shared connection, which stays open when it's pooled
+            if all(conn is not pooled_conn for pooled_conn in self._connections.values()):
+                with contextlib.suppress(*self.backend.errors):
+                    conn.close()
+
+    def _add_connect_time(self, database, connect_time):
+        """
+        Keeps the time spent on getting a connection, so it can be added to
+        the statistics of the next statement on that database.
+        """
+        self._pending_connect_times[database] = self._pending_connect_times.get(database, 0.0) + connect_time
+
+    def _record_statement(self, database, sql, execute_time=0.0, fetch_time=0.0, rows=0, size=0):
+        """
+        Records the timings, the number of rows affected or returned and the
+        (estimated) number of bytes sent or received of one statement. They
+        are added to the totals of the database and SQL fingerprint, so the
+        statistics don't grow with the number of statements.
+        """
+        fingerprint = _fingerprint_sql(sql)
+        totals = self.statement_stats.get((database, fingerprint))
+        if totals is None:
+            totals = {
+                "fingerprint": fingerprint,
+                "database": database,
+                "count": 0,
+                "connect_time": 0.0,
+                "execute_time": 0.0,
+                "fetch_time": 0.0,
+                "total_time": 0.0,
+                "rows": 0,
+                "bytes": 0,
+            }
+            self.statement_stats[(database, fingerprint)] = totals
+
+        connect_time = self._pending_connect_times.pop(database, 0.0)
+        totals["count"] += 1
+        totals["connect_time"] += connect_time
+        totals["execute_time"] += execute_time
+        totals["fetch_time"] += fetch_time
+        totals["total_time"] += connect_time + execute_time + fetch_time
+        totals["rows"] += max(rows, 0)
+        totals["bytes"] += size
+
+    def _measure_size(self, rows):
+        """
+        Estimates the number of bytes of the values in a list of rows, see
+        _estimate_size(). Returns 0 when the statement statistics aren't
+        reported, so the values of every row aren't walked for nothing.
+        """
+        if not (self.log_statement_stats or self.write_statement_stats):
+            return 0
+        return _estimate_size(rows)
+
+    def get_statement_summary(self):
+        """
+        Returns the statement statistics aggregated per database and SQL
+        fingerprint, as a list of dicts ordered from slowest to fastest. SQL
+        fingerprints are the statements with literals replaced by ?.
+        """
+        summary = [dict(totals) for totals in self.statement_stats.values()]
+        return sorted(summary, key=lambda totals: totals["total_time"], reverse=True)
+
+    def log_statement_summary(self):
+        """
+        Writes the statement summary to the log.
+        """
+        for totals in self.get_statement_summary():
+            logging.info(
+                f"{totals['database']} database, {totals['count']}x in {totals['total_time']:.3f} seconds "
+                f"(connect {totals['connect_time']:.3f}, execute {totals['execute_time']:.3f}, "
+                f"fetch {totals['fetch_time']:.3f}), {totals['rows']} rows, {totals['bytes']} bytes: "
+                f"{totals['fingerprint'][:100]}"
+            )
+
+    def write_statement_summary(self, file_name=None):
+        """
+        Writes the statement summary to a JSON file in the workdir. Returns
+        the path of the file.
+        """
+        if file_name is None:
+            file_name = f"statement_stats_{self.job_key}_{self.task_key}_{self.sequence}.json"
+        path = os.path.join(self.workdir, file_name)
+
+        with open(path, "w") as file:
+            json.dump(
+                {
+                    "job_name": self.job_name,
+                    "task_name": self.task_name,
+                    "sequence": self.sequence,
+                    "statements": self.get_statement_summary(),
+                },
+                file,
+                indent=2,
+            )
+        logging.info(f"Statement statistics written to {path}")
+        return path
+
     def query(self, conn, sql, params=None):
         """
         Generic query function. Used for all connections
@@ -123,17 +482,79 @@ class WhereScape:
 
         try:
             cursor = conn.cursor()
+            execute_start = time.perf_counter()
             cursor = cursor.execute(sql, params)
             # columns may be needed later.
             # columns = [column[0] for column in cursor.description]
+            fetch_start = time.perf_counter()
             values = cursor.fetchall()
+            fetch_end = time.perf_counter()
             conn.commit()
             cursor.close()
         except Exception as e:
+            self._rollback(conn)
             logging.error(e)
             raise
+
+        self._record_statement(
+            self._get_database_name(conn),
+            sql,
+            execute_time=fetch_start - execute_start,
+            fetch_time=fetch_end - fetch_start,
+            rows=len(values),
+            size=self._measure_size(values),
+        )
         return values
 
+    def iterate(self, conn, sql, params=None, batch_size=1000, batches=False, database=None):
+        """
+        Generic streaming query function. Used for all connections.
+        Fetches the resultset with fetchmany in batches of batch_size rows and
+        yields the rows one by one, or the batches themselves when batches is
+        True. Only one batch is held in memory at a time.
+
+        Note that the cursor stays open until the generator is exhausted or
+        closed, so don't run other statements on the same connection while
+        iterating. iter_meta, iter_target and iter_source iterate on a
+        connection of their own, so they can be combined with other statements.
+        """
+        if params is None:
+            params = []
+
+        execute_time, fetch_time, row_count, size = 0.0, 0.0, 0, 0
+        cursor = conn.cursor()
+        try:
+            execute_start = time.perf_counter()
+            cursor.execute(sql, params)
+            execute_time = time.perf_counter() - execute_start
+            while True:
+                fetch_start = time.perf_counter()
+                rows = cursor.fetchmany(batch_size)
+                fetch_time += time.perf_counter() - fetch_start
+                if not rows:
+                    break
+                row_count += len(rows)
+                size += self._measure_size(rows)
+                if batches:
+                    yield rows
+                else:
+                    yield from rows
+            conn.commit()
+        except Exception as e:
+            self._rollback(conn)
+            logging.error(e)
+            raise
+        finally:
+            cursor.close()
+            self._record_statement(
+                database if database is not None else self._get_database_name(conn),
+                sql,
+                execute_time=execute_time,
+                fetch_time=fetch_time,
+                rows=row_count,
+                size=size,
+            )
+
     def query_meta(self, sql, params=None):
         """
         Query the meta database. Makes use of the generic query function.
@@ -145,13 +566,26 @@ class WhereScape:
             params = []
 
         try:
-            conn = pyodbc.connect(self.meta_db_connection_string)
+            conn = self.get_connection("meta")
             result = self.query(conn, sql, params)
         except Exception as e:
+            self._handle_connection_error("meta", e)
             logging.error(e)
             raise
         return result
 
+    def iter_meta(self, sql, params=None, batch_size=1000, batches=False):
+        """
+        Streaming variant of query_meta. Yields the rows of a SELECT query on the
+        meta database (or lists of rows when batches is True) while they are being
+        fetched, so large resultsets are processed in constant memory.
+
+        Example:
+        for rows in iter_meta('SELECT * FROM schemaname.tablename', batch_size=100, batches=True):
+            process(rows)
+        """
+        yield from self._iterate_on_own_connection("meta", sql, params, batch_size, batches)
+
     def push_to_meta(self, sql, params=None):
         """
         Function to push data to the metadate database. Returns rowcount.
@@ -159,16 +593,24 @@ class WhereScape:
         if params is None:
             params = []
 
+        conn = None
         try:
-            conn = pyodbc.connect(self.meta_db_connection_string)
+            conn = self.get_connection("meta")
             cursor = conn.cursor()
+            execute_start = time.perf_counter()
             cursor = cursor.execute(sql, params)
             rowcount = cursor.rowcount
             conn.commit()
+            execute_time = time.perf_counter() - execute_start
             cursor.close()
         except Exception as e:
+            self._rollback(conn)
+            self._handle_connection_error("meta", e)
             logging.error(e)
             raise
+
+        size = self._measure_size([params or ()])
+        self._record_statement("meta", sql, execute_time=execute_time, rows=rowcount, size=size)
         return rowcount
 
     def query_target(self, sql, params=None):
@@ -179,13 +621,96 @@ class WhereScape:
             params = []
 
         try:
-            conn = pyodbc.connect(self.target_db_connection_string)
+            conn = self.get_connection("target")
             result = self.query(conn, sql, params)
         except Exception as e:
+            self._handle_connection_error("target", e)
             logging.error(e)
             raise
         return result
 
+    def iter_target(self, sql, params=None, batch_size=1000, batches=False):
+        """
+        Streaming variant of query_target. Yields the rows of a SELECT query on the
+        target database (or lists of rows when batches is True) while they are being
+        fetched, so large resultsets are processed in constant memory.
+
+        Example:
+        for rows in iter_target('SELECT * FROM schemaname.tablename', batch_size=100, batches=True):
+            process(rows)
+        """
+        yield from self._iterate_on_own_connection("target", sql, params, batch_size, batches)
+
+    def query_target_arrays(self, sql, params=None, batch_size=10000):
+        """
+        Query the target database and return the result column-wise: a dict
+        with a typed NumPy array per column, in the order of the SELECT. The
+        rows are fetched in batches and transposed per batch, so no list of
+        row objects is built. The array types follow cursor.description:
+
+        int                 - int64, or float64 with NaN when the column has NULLs
+        float, Decimal      - float64 with NaN for NULLs
+        bool                - bool, or object when the column has NULLs
+        datetime, date      - datetime64 with NaT for NULLs
+        other (e.g. str)    - object
+
+        Example:
+        arrays = query_target_arrays('SELECT id, amount FROM schemaname.tablename')
+        total = arrays['amount'].sum()
+        """
+        if params is None:
+            params = []
+
+        conn = None
+        try:
+            conn = self.get_connection("target")
+            cursor = conn.cursor()
+            execute_start = time.perf_counter()
+            cursor.execute(sql, params)
+            fetch_start = time.perf_counter()
+            description = cursor.description
+            columns = [[] for _ in description]
+            row_count, size = 0, 0
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                row_count += len(rows)
+                size += self._measure_size(rows)
+                for column, values in zip(columns, zip(*rows, strict=True), strict=True):
+                    column.extend(values)
+            fetch_end = time.perf_counter()
+            conn.commit()
+            cursor.close()
+        except Exception as e:
+            self._rollback(conn)
+            self._handle_connection_error("target", e)
+            logging.error(e)
+            raise
+
+        self._record_statement(
+            "target",
+            sql,
+            execute_time=fetch_start - execute_start,
+            fetch_time=fetch_end - fetch_start,
+            rows=row_count,
+            size=size,
+        )
+        return {
+            column_description[0]: _create_column_array(column, column_description[1])
+            for column_description, column in zip(description, columns, strict=True)
+        }
+
+    def query_target_frame(self, sql, params=None, batch_size=10000):
+        """
+        Query the target database and return the result as a pandas DataFrame,
+        built from the typed column arrays of query_target_arrays.
+        """
+        # Imported here to keep pandas out of the start-up time of scripts that don't need it.
+        import pandas as pd
+
+        return pd.DataFrame(self.query_target_arrays(sql, params, batch_size), copy=False)
+
     def push_to_target(self, sql, params=None):
         """
         Function to push data to the target database. Returns rowcount.
@@ -201,48 +726,253 @@ class WhereScape:
         if params is None:
             params = []
 
+        conn = None
         try:
-            conn = pyodbc.connect(self.target_db_connection_string)
+            conn = self.get_connection("target")
             cursor = conn.cursor()
+            execute_start = time.perf_counter()
             cursor = cursor.execute(sql, params)
             rowcount = cursor.rowcount
             conn.commit()
+            execute_time = time.perf_counter() - execute_start
             cursor.close()
         except Exception as e:
+            self._rollback(conn)
+            self._handle_connection_error("target", e)
             logging.error(e)
             raise
+
+        size = self._measure_size([params or ()])
+        self._record_statement("target", sql, execute_time=execute_time, rows=rowcount, size=size)
         return rowcount
 
-    def push_many_to_target(self, sql, params=None):
+    def push_many_to_target(
+        self,
+        sql,
+        params=None,
+        fast_executemany=False,
+        chunk_size=None,
+        commit_every_chunk=False,
+    ):
         """
-        Function to push data to the target database.
+        Function to push data to the target database. Returns the number of
+        rows pushed.
 
         Input :
-        sql     : a sql statement, possibly with ? placeholders for parameters
-        params  : list of tuples with values to replace ? placeholders in the SQL
+        sql                 : a sql statement, possibly with ? placeholders for parameters
+        params              : iterable (e.g. list or generator) of tuples with values to replace
+                              ? placeholders in the SQL
+        fast_executemany    : send the parameters of a chunk to the database as one array instead
+                              of doing a round-trip per row
+        chunk_size          : number of rows executed per executemany call. When None all rows are
+                              executed in one call. The throughput per chunk is logged
+        commit_every_chunk  : commit after every chunk instead of once at the end. On failure only
+                              the chunk that failed is rolled back
 
         Example:
         row1 = ('a',)
         row2 = ('b',)
         rows = [row1, row2]
-        push_to_target('INSERT INTO schemaname.tablename (columname) VALUES (?)',  rows )
+        push_many_to_target('INSERT INTO schemaname.tablename (columname) VALUES (?)',  rows )
+        push_many_to_target(sql, row_generator, fast_executemany=True, chunk_size=10000)
         """
         if params is None:
             params = []
 
+        conn = None
+        row_count, size, execute_time = 0, 0, 0.0
         try:
-            conn = pyodbc.connect(self.target_db_connection_string)
+            conn = self.get_connection("target")
             conn.autocommit = False
             cursor = conn.cursor()
-            cursor.executemany(sql, params)
+            cursor.fast_executemany = fast_executemany
+            for chunk in chunk_iterable(params, chunk_size):
+                chunk_start = time.perf_counter()
+                cursor.executemany(sql, chunk)
+                if commit_every_chunk:
+                    conn.commit()
+                elapsed = time.perf_counter() - chunk_start
+                execute_time += elapsed
+                row_count += len(chunk)
+                size += self._measure_size(chunk)
+
+                if chunk_size:
+                    elapsed = max(elapsed, 0.001)
+                    logging.info(
+                        f"Pushed {len(chunk)} rows in {elapsed:.2f} seconds ({len(chunk) / elapsed:.0f} rows/sec), "
+                        f"{row_count} rows in total"
+                    )
         except Exception as e:
-            conn.rollback()
+            self._rollback(conn)
+            self._handle_connection_error("target", e)
             logging.error(e)
             raise
         else:
+            commit_start = time.perf_counter()
             conn.commit()
+            execute_time += time.perf_counter() - commit_start
             cursor.close()
 
+        self._record_statement("target", sql, execute_time=execute_time, rows=row_count, size=size)
+        return row_count
+
+    def bulk_load_to_target(self, table_name, columns, rows, load_method="executemany", chunk_size=10000):
+        """
+        Function to load rows into a (load) table of the target database.
+        Returns the number of rows loaded.
+
+        Input :
+        table_name  : 'schema.table' of the table to load
+        columns     : list with the column names, in the order of the row values
+        rows        : iterable (e.g. list or generator) of lists or tuples with values
+        load_method : one of
+                      'executemany' - parameterised INSERT per row (push_many_to_target)
+                      'fast_executemany' - like 'executemany', but the parameters of a chunk are
+                                      sent as one array (pyodbc fast_executemany)
+                      'values'      - multi-row INSERT ... VALUES (?, ...), (?, ...) statements
+                      'copy'        - PostgreSQL COPY FROM STDIN, streamed per chunk. Needs the
+                                      psycopg package; falls back to 'values' when it's missing
+        chunk_size  : number of rows serialised or executed at once
+
+        All rows are loaded in one transaction.
+
+        Example:
+        bulk_load_to_target('load.load_table', ['id', 'name'], rows, load_method='copy')
+        """
+        if load_method not in LOAD_METHODS:
+            raise ValueError(f"Invalid load method: {load_method}. Choose one of {', '.join(LOAD_METHODS)}")
+
+        if load_method == "copy" and psycopg is None:
+            logging.warning("The psycopg package is not installed, falling back to the 'values' load method")
+            load_method = "values"
+        elif load_method == "copy" and not self.backend.supports_copy:
+            logging.warning(f"The {self.backend.name} backend can't COPY, falling back to the 'values' load method")
+            load_method = "values"
+
+        start_time = time.monotonic()
+        if load_method == "copy":
+            row_count = self._copy_to_target(table_name, columns, rows, chunk_size)
+        elif load_method == "values":
+            row_count = self._insert_values_to_target(table_name, columns, rows, chunk_size)
+        else:
+            column_names_string = ",".join(columns)
+            question_mark_string = ",".join("?" for _ in columns)
+            sql = f"INSERT INTO {table_name} ({column_names_string}) VALUES ({question_mark_string})"
+            row_count = self.push_many_to_target(
+                sql, rows, fast_executemany=load_method == "fast_executemany", chunk_size=chunk_size
+            )
+
+        logging.info(
+            f"Loaded {row_count} rows into {table_name} with the {load_method} load method "
+            f"in {time.monotonic() - start_time:.2f} seconds"
+        )
+        return row_count
+
+    def _insert_values_to_target(self, table_name, columns, rows, chunk_size):
+        """
+        Loads rows with multi-row INSERT statements, so a whole chunk of rows
+        costs one round-trip instead of one per row.
+        """
+        rows_per_statement = max(1, min(chunk_size, self.max_statement_parameters // len(columns)))
+        column_names_string = ",".join(columns)
+        row_placeholder = "(" + ",".join("?" for _ in columns) + ")"
+
+        conn = None
+        row_count, size, execute_time = 0, 0, 0.0
+        sql = f"INSERT INTO {table_name} ({column_names_string}) VALUES {row_placeholder}"
+        try:
+            conn = self.get_connection("target")
+            conn.autocommit = False
+            cursor = conn.cursor()
+            for chunk in chunk_iterable(rows, rows_per_statement):
+                values_string = ",".join(row_placeholder for _ in chunk)
+                sql = f"INSERT INTO {table_name} ({column_names_string}) VALUES {values_string}"
+                execute_start = time.perf_counter()
+                cursor.execute(sql, [value for row in chunk for value in row])
+                execute_time += time.perf_counter() - execute_start
+                row_count += len(chunk)
+                size += self._measure_size(chunk)
+        except Exception as e:
+            self._rollback(conn)
+            self._handle_connection_error("target", e)
+            logging.error(e)
+            raise
+        else:
+            commit_start = time.perf_counter()
+            conn.commit()
+            execute_time += time.perf_counter() - commit_start
+            cursor.close()
+
+        self._record_statement("target", sql, execute_time=execute_time, rows=row_count, size=size)
+        return row_count
+
+    def _copy_to_target(self, table_name, columns, rows, chunk_size):
+        """
+        Loads rows with a PostgreSQL COPY statement. Rows are serialised per
+        chunk into an in-memory buffer in the COPY text format and streamed to
+        the server.
+        """
+        conn = None
+        column_names_string = ",".join(columns)
+        sql = f"COPY {table_name} ({column_names_string}) FROM STDIN"
+        row_count, size, execute_time = 0, 0, 0.0
+        try:
+            conn = self._get_copy_connection()
+            with conn.cursor() as cursor:
+                with cursor.copy(sql) as copy:
+                    for chunk in chunk_iterable(rows, chunk_size):
+                        buffer = io.StringIO()
+                        for row in chunk:
+                            buffer.write("\t".join(_copy_text_value(value) for value in row))
+                            buffer.write("\n")
+                        data = buffer.getvalue()
+                        execute_start = time.perf_counter()
+                        copy.write(data)
+                        execute_time += time.perf_counter() - execute_start
+                        row_count += len(chunk)
+                        size += len(data)
+                    # Leaving the copy block waits for the server to process the data
+                    commit_start = time.perf_counter()
+        except Exception as e:
+            if conn is not None:
+                conn.rollback()
+            logging.error(e)
+            raise
+        else:
+            conn.commit()
+            execute_time += time.perf_counter() - commit_start
+
+        self._record_statement("target", sql, execute_time=execute_time, rows=row_count, size=size)
+        return row_count
+
+    def _get_copy_connection(self):
+        """
+        Returns a psycopg connection to the target database for COPY loads.
+        Uses the WSL_TGT_* environment variables; when the database name isn't
+        set it's taken from the ODBC connection.
+        """
+        conn = self._copy_connections.get("target")
+        if conn is not None and not conn.closed:
+            return conn
+
+        start_time = time.perf_counter()
+
+        database = os.getenv("WSL_TGT_DB")
+        if not database:
+            database = self.backend.get_database_name(self.get_connection("target"))
+
+        conn = psycopg.connect(
+            host=os.getenv("WSL_TGT_SERVER"),
+            port=os.getenv("WSL_TGT_DBPORT") or 5432,
+            dbname=database,
+            user=os.getenv("WSL_TGT_USER"),
+            password=os.getenv("WSL_TGT_PWD"),
+            sslmode="prefer",
+        )
+        self._copy_connections["target"] = conn
+        self._add_connect_time("target", time.perf_counter() - start_time)
+        return conn
+
     def query_source(self, sql, params=[]):
         """
         Query a source database. Makes use of the generic query function.
@@ -250,13 +980,26 @@ class WhereScape:
         Returns a list of tuples
         """
         try:
-            conn = pyodbc.connect(self.source_db_connection_string)
+            conn = self.get_connection("source")
             result = self.query(conn, sql, params)
         except Exception as e:
+            self._handle_connection_error("source", e)
             logging.error(e)
             raise
         return result
 
+    def iter_source(self, sql, params=None, batch_size=1000, batches=False):
+        """
+        Streaming variant of query_source. Yields the rows of a SELECT query on the
+        source database (or lists of rows when batches is True) while they are being
+        fetched, so large resultsets are processed in constant memory.
+
+        Example:
+        for rows in iter_source('SELECT * FROM schemaname.tablename', batch_size=100, batches=True):
+            process(rows)
+        """
+        yield from self._iterate_on_own_connection("source", sql, params, batch_size, batches)
+
     def push_to_source(self, sql, params=[]):
         """
         Function to push data to a source database. Returns rowcount.
@@ -269,24 +1012,55 @@ class WhereScape:
         push_to_source('INSERT INTO schemaname.tablename (columname) VALUES (?)',  (value,) )
 
         """
+        conn = None
         try:
-            conn = pyodbc.connect(self.source_db_connection_string)
+            conn = self.get_connection("source")
             cursor = conn.cursor()
+            execute_start = time.perf_counter()
             cursor = cursor.execute(sql, params)
         except Exception as e:
             rowcount = 0
-            conn.rollback()
+            self._rollback(conn)
+            self._handle_connection_error("source", e)
             logging.error(e)
             raise
         else:
             rowcount = cursor.rowcount
             conn.commit()
             cursor.close()
+            execute_time = time.perf_counter() - execute_start
+            size = self._measure_size([params or ()])
+            self._record_statement("source", sql, execute_time=execute_time, rows=rowcount, size=size)
         return rowcount
 
-    def read_parameter(self, name, include_comment=False):
+    def read_parameter(self, name, include_comment=False, use_cache=True):
         """
         Function to read a parameter from Wherescape.
+
+        Parameters are cached on the instance, so reading the same parameter
+        again doesn't cost a round-trip. Parameters that fall under a prefix
+        loaded with prefetch_parameters are always served from the cache. Set
+        use_cache to False to read the current value from the repository.
+        """
+        key = name.lower()
+        if use_cache and key in self._parameters:
+            parameter, comment = self._parameters[key]
+        elif use_cache and any(key.startswith(prefix) for prefix in self._prefetched_parameter_prefixes):
+            # The parameter doesn't exist, otherwise it would have been prefetched
+            parameter, comment = "", ""
+        else:
+            parameter, comment = self._read_parameter_from_repository(name)
+            self._parameters[key] = (parameter, comment)
+
+        if include_comment:
+            return parameter, comment
+
+        # else:
+        return parameter
+
+    def _read_parameter_from_repository(self, name):
+        """
+        Reads a parameter and its comment with the WsParameterRead procedure.
         """
         # Intialize return values
         result = ""
@@ -299,6 +1073,8 @@ class WhereScape:
             ,@p_value = @out OUTPUT
             ,@p_comment=@out1 OUTPUT
             SELECT @out AS p_value,@out1 AS p_comment;"""  # noqa: E101
+        # Backends without the WhereScape procedures provide their own SQL
+        sql = self.backend.statements.get("WsParameterRead", sql)
 
         try:
             result = self.query_meta(sql, [name])
@@ -312,15 +1088,52 @@ class WhereScape:
                 parameter = result[0][0]
                 comment = result[0][1]
 
-        if include_comment:
-            return parameter, comment
+        return parameter, comment
 
-        # else:
-        return parameter
+    def prefetch_parameters(self, prefix=""):
+        """
+        Reads all parameters whose name starts with prefix in one query and
+        caches them, so subsequent read_parameter calls for these parameters
+        don't need a round-trip to the repository. Without a prefix all
+        parameters are read.
+
+        Returns the number of parameters read.
+        """
+        # Escape the LIKE wildcards, so the prefix is matched literally
+        like_prefix = self.backend.escape_like(prefix)
+        sql = """
+        SELECT dss_parameter_name, dss_parameter_value, dss_parameter_comments
+        FROM dss_parameter
+        WHERE dss_parameter_name LIKE ?"""
+        sql = self.backend.statements.get("prefetch_parameters", sql)
+        results = self.query_meta(sql, [like_prefix + "%"])
+
+        for name, value, comment in results:
+            self._parameters[name.lower()] = (value, comment)
+        self._prefetched_parameter_prefixes.append(prefix.lower())
+
+        logging.info(f"Prefetched {len(results)} parameters starting with '{prefix}'")
+        return len(results)
+
+    def invalidate_parameters(self, name=None):
+        """
+        Removes a parameter from the parameter cache, or all parameters when no
+        name is given, so they are read from the repository again.
+        """
+        if name is None:
+            self._parameters = {}
+            self._prefetched_parameter_prefixes = []
+        else:
+            self._parameters.pop(name.lower(), None)
+            # The parameter can't be considered prefetched anymore
+            self._prefetched_parameter_prefixes = [
+                prefix for prefix in self._prefetched_parameter_prefixes if not name.lower().startswith(prefix)
+            ]
 
     def write_parameter(self, name, value="", comment=None):
         """
-        Function to update or insert a parameter into Wherescape.
+        Function to update or insert a parameter into Wherescape. The parameter
+        cache is updated as well.
 
         Returns result number:
         1 Metadata Parameter Updated
@@ -334,8 +1147,15 @@ class WhereScape:
         , @p_value = ?
         , @p_comment  = ?
         SELECT @out AS return_value;"""
+        sql = self.backend.statements.get("WsParameterWrite", sql)
         result_number = self.push_to_meta(sql, [name, value, comment])
         result_number = int(result_number)
+
+        key = name.lower()
+        if comment is None and key in self._parameters:
+            # The comment is left as it is
+            comment = self._parameters[key][1]
+        self._parameters[key] = (value, comment)
         return result_number
 
     def job_clear_logs_by_date(self, days_to_retain=90, job_to_clean="%"):
@@ -378,6 +1198,7 @@ class WhereScape:
         , @p_return_msg = @out1 OUTPUT
         , @p_result   = @out2 OUTPUT;
         SELECT @out AS return_code,@out1 AS return_msg,@out2 AS return_result"""
+        sql = self.backend.statements.get("Ws_Job_Clear_Logs_By_Date", sql)
 
         return_values = self.query_meta(sql, self.common_input_parameter_list + function_parameter_list)
         return_code = return_values[0][0]
@@ -429,6 +1250,7 @@ class WhereScape:
         , @p_return_msg = @out1 OUTPUT
         , @p_result   = @out2 OUTPUT;
         SELECT @out AS return_code,@out1 AS return_msg,@out2 AS return_result;"""
+        sql = self.backend.statements.get("Ws_Job_Clear_Archive", sql)
 
         return_values = self.query_meta(sql, self.common_input_parameter_list + function_parameter_list)
         return_code = return_values[0][0]
@@ -486,6 +1308,7 @@ class WhereScape:
         , @p_errored   = ?;
         SELECT @out AS return_value;
         """
+        sql = self.backend.statements.get("WsWrkTask", sql)
 
         sequence = os.environ["WSL_SEQUENCE"]
         job_name = os.environ["WSL_JOB_NAME"]
@@ -513,3 +1336,90 @@ class WhereScape:
             logging.error(
                 f"Error in update task log for job id/name: {job_id}  {job_name} task is/name: {task_id} {task_name} : {str(e)}"
             )
+
+
+def _finalize_instance(instance_ref, connections, copy_connections):
+    """
+    Finalizer of a WhereScape instance. When the script exits while the
+    instance is still in use, the statement statistics are reported and all
+    connections are closed. When the instance has been garbage collected,
+    its pooled connections and COPY connections are closed.
+    """
+    instance = instance_ref()
+    if instance is not None:
+        instance._on_exit()
+        return
+    for conn in [*connections.values(), *copy_connections.values()]:
+        with contextlib.suppress(Exception):
+            conn.close()
+    connections.clear()
+    copy_connections.clear()
+
+
+def _copy_text_value(value):
+    """
+    Serialises a value to the PostgreSQL COPY text format.
+    """
+    # NaN and NaT (e.g. from DataFrame.values.tolist()) are missing values too, they don't equal themselves
+    if value is None or (isinstance(value, float | Decimal | datetime) and value != value):
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _create_column_array(values, type_code):
+    """
+    Creates a typed NumPy array for the values of a column, based on the
+    Python type that the cursor description gives for the column.
+    """
+    # Imported here to keep numpy out of the start-up time of scripts that don't need it.
+    import numpy as np
+
+    has_nulls = None in values
+    if type_code is bool:
+        dtype = object if has_nulls else np.bool_
+    elif type_code is int:
+        dtype = np.float64 if has_nulls else np.int64
+    elif type_code in (float, Decimal):
+        dtype = np.float64
+    elif type_code is datetime:
+        dtype = "datetime64[us]"
+    elif type_code is date:
+        dtype = "datetime64[D]"
+    else:
+        dtype = object
+    return np.array(values, dtype=dtype)
+
+
+@functools.lru_cache(maxsize=256)
+def _fingerprint_sql(sql):
+    """
+    Normalises a SQL statement so that statements that only differ in their
+    literal values or number of VALUES rows get the same fingerprint.
+    """
+    fingerprint = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    fingerprint = re.sub(r"\b\d+(?:\.\d+)?\b", "?", fingerprint)
+    fingerprint = re.sub(r"\s+", " ", fingerprint).strip()
+    fingerprint = re.sub(r"(\(\?(?:, ?\?)*\))(?:, ?\(\?(?:, ?\?)*\))+", r"\1, ...", fingerprint)
+    return fingerprint[:500]
+
+
+def _estimate_size(rows):
+    """
+    Estimates the number of bytes of the values in a list of rows. Strings
+    and bytes count their length, other values count 8 bytes.
+    """
+    size = 0
+    for row in rows:
+        for value in row:
+            if isinstance(value, (str, bytes)):
+                size += len(value)
+            elif value is not None:
+                size += 8
+    return size
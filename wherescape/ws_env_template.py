@@ -12,11 +12,16 @@ Usage
 import os
 
 
-def setup_env(tablename, schema="load", environment="dev1", source="dev1"):
+def setup_env(tablename, schema="load", environment="dev1", source="dev1", backend="odbc", sqlite_path=":memory:"):
     """
     Import and execute this function to set environment variables as if WhereScape was running.
 
     This way you can run python scripts independant from the WhereScape UI
+
+    With backend="sqlite" the WhereScape repository and the target and source
+    databases are emulated with SQLite (see wherescape/backends.py), so no
+    WhereScape server or ODBC drivers are needed. sqlite_path is the database
+    file to use, by default everything is kept in memory.
     """
     capped_environment = environment.capitalize()
 
@@ -107,6 +112,11 @@ def setup_env(tablename, schema="load", environment="dev1", source="dev1"):
 
     os.environ["WSL_TEMP_DB"] = ""
 
+    os.environ["WSL_BACKEND"] = backend
+    if backend == "sqlite":
+        os.environ["WSL_SQLITE_PATH"] = sqlite_path
+        os.environ["WSL_SQLITE_SCHEMAS"] = "load,stage"
+
     # setup passwords for warehouse.py
     git_dir = r"C:\WhereScape\GitlabRepository"
 